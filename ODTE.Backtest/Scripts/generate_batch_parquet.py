@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Batch generation of synthetic minute bars across years and symbols.
+Shards work by symbol/month over a process pool; every shard has a deterministic seed
+and writes its own part into the hive-partitioned dataset (symbol=/year=/month=), so reruns
+of any shard are reproducible in isolation. Days already present in the dataset are skipped,
+which makes extending the end date an append: a month that already has data continues from its
+last close with a seed of its own.
+
+Usage:
+  python generate_batch_parquet.py --start 2005-01-01 --end 2024-12-31 --symbols SPX,XSP,SPY,QQQ --workers 8
+"""
+
+import argparse
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from generate_full_day_parquet import (
+    MarketDataGenerator, daily_vol, dataset_spans, partition_dir, partition_last_close, update_dataset_metadata,
+    write_dataset_parts
+)
+
+# Reference opening levels (Feb 2024) used to anchor each symbol's synthetic path
+SYMBOL_START_PRICES = {
+    'SPX': 4951.00,
+    'XSP': 495.10,
+    'SPY': 494.35,
+    'QQQ': 427.30,
+}
+ANCHOR_MONTH = (2024, 2)  # Month the reference levels open; the anchor walk runs both ways from it
+_ANCHOR_STREAM = zlib.crc32(b'anchor')  # Keeps the walk's draws apart from the shard seeds
+
+# ---------------------------------------------------------------------------
+# Trading calendar
+# ---------------------------------------------------------------------------
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th (1-based) weekday of a month; n=-1 gives the last one"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    day = (h + l - 7 * m + 33 * month + 19) % 32
+    return date(year, month, day)
+
+def _observed(d):
+    """Saturday holidays are observed Friday, Sunday holidays on Monday"""
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+def nyse_holidays(year):
+    """Regular NYSE full-day holidays (one-off closures such as 2012 Sandy are not included)"""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),             # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),             # Washington's Birthday
+        _easter(year) - timedelta(days=2),       # Good Friday
+        _nth_weekday(year, 5, 0, -1),            # Memorial Day
+        _observed(date(year, 7, 4)),             # Independence Day
+        _nth_weekday(year, 9, 0, 1),             # Labor Day
+        _nth_weekday(year, 11, 3, 4),            # Thanksgiving
+        _observed(date(year, 12, 25)),           # Christmas
+    }
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:                  # NYSE does not observe a Saturday New Year on Dec 31
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return holidays
+
+def trading_days(start, end, calendar='nyse'):
+    """
+    Trading sessions in [start, end].
+    'nyse' uses the built-in holiday rules, 'weekdays' ignores holidays, and any other
+    name is resolved through pandas_market_calendars when it is installed.
+    """
+    if calendar not in ('nyse', 'weekdays'):
+        try:
+            import pandas_market_calendars as mcal
+        except ImportError:
+            raise SystemExit(f"ERROR: calendar '{calendar}' requires pandas_market_calendars")
+        return [d.date() for d in mcal.get_calendar(calendar).valid_days(start, end)]
+
+    holidays = set()
+    if calendar == 'nyse':
+        for year in range(start.year, end.year + 1):
+            holidays |= nyse_holidays(year)
+    days = []
+    d = start
+    while d <= end:
+        if d.weekday() < 5 and d not in holidays:
+            days.append(d)
+        d += timedelta(days=1)
+    return days
+
+# ---------------------------------------------------------------------------
+# Sharding
+# ---------------------------------------------------------------------------
+
+def _symbol_key(symbol):
+    """Process-independent integer key for a symbol (str hash() is salted per process)"""
+    return zlib.crc32(symbol.encode())
+
+def shard_seed(seed, symbol, year, month, day=None):
+    """Deterministic seed for one symbol/month shard (day: first session of an append to the month)"""
+    return np.random.SeedSequence([seed, _symbol_key(symbol), year, month] + ([] if day is None else [day]))
+
+def _month_step(seed, symbol, year, month):
+    """Log move of the anchor over one month, drawn from that month alone"""
+    first = np.datetime64(f"{year:04d}-{month:02d}", 'M')
+    sessions = np.busday_count(first.astype('datetime64[D]'), (first + 1).astype('datetime64[D]'))
+    rng = np.random.default_rng([seed, _symbol_key(symbol), _ANCHOR_STREAM, year, month])
+    return rng.normal(0, daily_vol * np.sqrt(sessions))
+
+def month_anchors(symbol, seed, months):
+    """
+    Opening level of each (year, month): a monthly random walk through the full calendar from the
+    reference level at ANCHOR_MONTH, so a month's anchor does not depend on the requested window.
+    """
+    ref = SYMBOL_START_PRICES.get(symbol, SYMBOL_START_PRICES['SPX'])
+    index = lambda ym: ym[0] * 12 + ym[1] - 1
+    lo, hi = min(map(index, months), default=0), max(map(index, months), default=0)
+    lo, hi = min(lo, index(ANCHOR_MONTH)), max(hi, index(ANCHOR_MONTH))
+    steps = np.array([_month_step(seed, symbol, i // 12, i % 12 + 1) for i in range(lo, hi + 1)])
+    # log anchor = sum of the monthly steps from ANCHOR_MONTH to the month before, negated for earlier months
+    log_level = np.concatenate(([0.0], np.cumsum(steps)))
+    log_level -= log_level[index(ANCHOR_MONTH) - lo]
+    return {ym: ref * np.exp(log_level[index(ym) - lo]) for ym in months}
+
+def plan_shards(days, symbols, seed, spans=None, root=None):
+    """
+    Split sessions into symbol/month shards.
+    Each shard opens at its month's anchor (see month_anchors), so shards can run independently
+    while the long-horizon level still wanders. Sessions already covered by `spans` (see
+    dataset_spans) are left out; the rest of a month that has data continues from the close last
+    written to it under `root`, seeded by its first new session. Parts only extend a month forward,
+    so sessions before its existing coverage are skipped with a warning.
+    """
+    spans = spans or {}
+    months = {}
+    for d in days:
+        months.setdefault((d.year, d.month), []).append((d.year, d.month, d.day))
+
+    shards = []
+    for symbol in symbols:
+        anchors = month_anchors(symbol, seed, months)
+        for (year, month), month_days in sorted(months.items()):
+            part = partition_dir(symbol, year, month)
+            covered = spans.get(part)
+            new_days = [d for d in month_days if covered is None or pd.Timestamp(*d) > pd.Timestamp(covered[1])]
+            first = None if covered is None else pd.Timestamp(covered[0]).normalize()
+            early = sum(pd.Timestamp(*d) < first for d in month_days) if first is not None else 0
+            if early:
+                print(f"WARNING: {part} starts {first:%Y-%m-%d}; skipping {early} earlier session(s) "
+                      f"(rewrite the partition to add them)")
+            if not new_days:
+                continue
+            start_price, day = anchors[(year, month)], None
+            if covered is not None:
+                last_close = partition_last_close(root, part) if root else None
+                start_price = anchors[(year, month)] if last_close is None else last_close
+                day = new_days[0][2]
+            shards.append({
+                'symbol': symbol,
+                'year': year,
+                'month': month,
+                'dates': new_days,
+                'start_price': round(start_price, 2),
+                'seed': shard_seed(seed, symbol, year, month, day),
+            })
+    return shards
+
+def generate_shard(shard, out_dir):
+    """Worker: generate one symbol/month and write it as its own part in the dataset"""
+    generator = MarketDataGenerator(symbol=shard['symbol'], start_price=shard['start_price'], seed=shard['seed'])
+    table = generator.generate_multi_day_table(shard['dates'], verbose=False)
+    return write_dataset_parts(table, out_dir), table.num_rows
+
+def run_batch(shards, out_dir, workers):
+    """
+    Run all shards across a process pool; returns [(rel_paths, rows)] in shard order.
+    All or nothing: when a shard fails, the parts the others wrote are removed before the error is
+    raised, so _metadata and the files on disk still agree and a rerun starts clean.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    results = [None] * len(shards)
+    errors = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(generate_shard, shard, out_dir): i for i, shard in enumerate(shards)}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                errors.append((futures[future], e))
+            if done % 50 == 0 or done == len(shards):
+                print(f"PROGRESS: {done}/{len(shards)} shards written")
+    if errors:
+        for paths, _ in filter(None, results):
+            for rel_path in paths:
+                os.remove(os.path.join(out_dir, rel_path))
+        i, e = min(errors, key=lambda err: err[0])
+        shard = shards[i]
+        raise RuntimeError(f"{len(errors)} of {len(shards)} shards failed, nothing was added to {out_dir} "
+                           f"(first: {shard['symbol']} {shard['year']}-{shard['month']:02d})") from e
+    # Only the parent touches _metadata, appending parts in shard order
+    update_dataset_metadata(out_dir, [p for paths, _ in results for p in paths])
+    return results
+
+def main():
+    ap = argparse.ArgumentParser(description='Multi-year, multi-symbol synthetic minute-bar generator (partitioned Parquet dataset).')
+    ap.add_argument('--start', required=True, help='First session (YYYY-MM-DD)')
+    ap.add_argument('--end', required=True, help='Last session (YYYY-MM-DD)')
+    ap.add_argument('--symbols', default='SPX,XSP,SPY,QQQ', help='Comma-separated symbols')
+    ap.add_argument('--calendar', default='nyse', help="Trading calendar: nyse, weekdays, or a pandas_market_calendars name")
+    ap.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    ap.add_argument('--seed', type=int, default=212, help='Base seed; each symbol/month shard derives its own')
+    ap.add_argument('--out', default='../Samples/bars_dataset', help='Dataset root (appended to if it exists)')
+    args = ap.parse_args()
+
+    start = date.fromisoformat(args.start)
+    end = date.fromisoformat(args.end)
+    symbols = [s.strip().upper() for s in args.symbols.split(',') if s.strip()]
+    days = trading_days(start, end, args.calendar)
+    if not days:
+        raise SystemExit('ERROR: no trading sessions in the requested range')
+
+    shards = plan_shards(days, symbols, args.seed, dataset_spans(args.out), args.out)
+    if not shards:
+        print(f"SUCCESS: {args.out} already covers the requested range")
+        return
+    print(f"TARGET: {len(days)} sessions x {len(symbols)} symbols -> {len(shards)} shards on {args.workers} workers")
+
+    t0 = time.perf_counter()
+    results = run_batch(shards, args.out, args.workers)
+    elapsed = time.perf_counter() - t0
+
+    total_rows = sum(rows for _, rows in results)
+    print(f"SUCCESS: Wrote {total_rows:,} bars in {len(results)} parts to {args.out} ({elapsed:.1f}s)")
+
+if __name__ == "__main__":
+    main()
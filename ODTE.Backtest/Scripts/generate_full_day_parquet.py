@@ -16,14 +16,20 @@ import os
 daily_vol = 0.015  # 1.5% daily volatility (typical for SPX)
 
 class MarketDataGenerator:
-    """Professional-grade market data generator for 0DTE options backtesting"""
+    """
+    Professional-grade market data generator for 0DTE options backtesting.
+    Both engines draw from the generator's own np.random.Generator seeded by `seed`, not from the
+    global np.random state: np.random.seed() no longer affects the bars, and seeded output differs
+    from versions that used the global state.
+    """
     
-    def __init__(self, symbol="SPX", start_price=4951.00):
+    def __init__(self, symbol="SPX", start_price=4951.00, seed=None):
         self.symbol = symbol
         self.start_price = start_price
+        self.rng = np.random.default_rng(seed)  # Same seed => same bars on either engine
         
     def generate_multi_day_data(self, dates):
-        """Generate data for multiple trading days"""
+        """Generate data for multiple trading days (scalar reference path, list of dicts)"""
         all_bars = []
         
         for i, (year, month, day) in enumerate(dates):
@@ -33,7 +39,7 @@ class MarketDataGenerator:
             # Each day starts near previous close with realistic gap
             if all_bars:
                 prev_close = all_bars[-1]['close']
-                start_price = prev_close + np.random.normal(0, prev_close * 0.002)  # Small overnight gap
+                start_price = prev_close + self.rng.normal(0, prev_close * 0.002)  # Small overnight gap
             else:
                 start_price = self.start_price
                 
@@ -45,16 +51,35 @@ class MarketDataGenerator:
         
         return all_bars
     
-    def _generate_day_bars(self, start_time, end_time, start_price):
-        """Generate realistic bars for a single trading day"""
-        total_minutes = int((end_time - start_time).total_seconds() / 60)  # 390 minutes
-        minute_vol = daily_vol / np.sqrt(390)  # Scale daily vol to minute vol
-        
-        bars = []
-        current_time = start_time
-        current_price = start_price
+    def generate_multi_day_table(self, dates, verbose=True):
+        """Generate data for multiple trading days with the vectorized engine (Arrow table).
+        Bar-for-bar identical to generate_multi_day_data for the same seed."""
+        return pa.Table.from_batches(list(self.iter_day_batches(dates, verbose)), schema=BAR_SCHEMA)
+    
+    def iter_day_batches(self, dates, verbose=True):
+        """Yield one pyarrow.RecordBatch per trading day; only the current day is held in memory"""
+        prev_close = None
         
-        # Realistic intraday patterns
+        for year, month, day in dates:
+            start_time = datetime(year, month, day, 14, 30)  # 2:30 PM EST
+            end_time = datetime(year, month, day, 21, 0)     # 9:00 PM EST
+            
+            if prev_close is not None:
+                start_price = prev_close + self.rng.normal(0, prev_close * 0.002)  # Small overnight gap
+            else:
+                start_price = self.start_price
+                
+            day_table = self._generate_day_columns(start_time, end_time, start_price)
+            prev_close = day_table.column('close')[-1].as_py()
+            
+            if verbose:
+                print(f"SUCCESS: Generated {day_table.num_rows} bars for {year}-{month:02d}-{day:02d}")
+            
+            yield day_table.combine_chunks().to_batches()[0]
+    
+    def _session_patterns(self, total_minutes):
+        """Intraday volume/volatility shapes shared by both engines"""
+        minute_vol = daily_vol / np.sqrt(390)  # Scale daily vol to minute vol
         minutes_from_start = np.arange(total_minutes)
         
         # U-shaped volume pattern (high at open/close, lower midday)
@@ -63,15 +88,33 @@ class MarketDataGenerator:
         
         # Declining volatility pattern (gamma decay for 0DTE)
         vol_pattern = minute_vol * (1.8 - 1.2 * minutes_from_start / total_minutes)
+        return volume_pattern, vol_pattern
+    
+    def _draw_day_shocks(self, total_minutes):
+        """Draw every random variate a day needs as whole arrays, in a fixed order"""
+        trend_strength = self.rng.uniform(-0.0002, 0.0002)  # Random daily trend
+        price_shock = self.rng.standard_normal(total_minutes)
+        range_shock = self.rng.standard_exponential(total_minutes)
+        high_shock, low_shock = self.rng.random((2, total_minutes))
+        volume_shock = np.exp(0.2 * self.rng.standard_normal(total_minutes))  # Lognormal(0, 0.2)
+        return trend_strength, price_shock, range_shock, high_shock, low_shock, volume_shock
+    
+    def _generate_day_bars(self, start_time, end_time, start_price):
+        """Generate realistic bars for a single trading day (scalar reference path)"""
+        total_minutes = int((end_time - start_time).total_seconds() / 60)  # 390 minutes
+        volume_pattern, vol_pattern = self._session_patterns(total_minutes)
+        trend_strength, price_shock, range_shock, high_shock, low_shock, volume_shock = \
+            self._draw_day_shocks(total_minutes)
         
-        # Trend component (slight drift)
-        trend_strength = np.random.uniform(-0.0002, 0.0002)  # Random daily trend
+        bars = []
+        current_time = start_time
+        current_price = start_price
         
         for i in range(total_minutes):
             vol = vol_pattern[i]
             
             # Price evolution with mean reversion and trend
-            random_component = np.random.normal(0, vol * current_price)
+            random_component = price_shock[i] * (vol * current_price)
             trend_component = trend_strength * current_price
             
             # Mean reversion (prevents prices from drifting too far)
@@ -86,16 +129,16 @@ class MarketDataGenerator:
             close_price = current_price + price_change
             
             # Generate realistic high/low with volatility-based spread
-            intrabar_range = abs(price_change) + np.random.exponential(vol * current_price * 0.3)
-            high_price = max(open_price, close_price) + np.random.uniform(0, intrabar_range * 0.6)
-            low_price = min(open_price, close_price) - np.random.uniform(0, intrabar_range * 0.6)
+            intrabar_range = abs(price_change) + range_shock[i] * (vol * current_price * 0.3)
+            high_price = max(open_price, close_price) + high_shock[i] * (intrabar_range * 0.6)
+            low_price = min(open_price, close_price) - low_shock[i] * (intrabar_range * 0.6)
             
             # Ensure OHLC constraints
             high_price = max(high_price, open_price, close_price)
             low_price = min(low_price, open_price, close_price)
             
             # Volume with microstructure noise
-            volume = int(volume_pattern[i] * np.random.lognormal(0, 0.2))  # Lognormal for realistic distribution
+            volume = int(volume_pattern[i] * volume_shock[i])  # Lognormal for realistic distribution
             volume = max(50000, volume)  # Minimum volume floor
             
             bars.append({
@@ -114,10 +157,72 @@ class MarketDataGenerator:
             current_time += timedelta(minutes=1)
         
         return bars
+    
+    def _generate_day_columns(self, start_time, end_time, start_price):
+        """Generate a single trading day as an Arrow table (vectorized engine)"""
+        total_minutes = int((end_time - start_time).total_seconds() / 60)  # 390 minutes
+        volume_pattern, vol_pattern = self._session_patterns(total_minutes)
+        trend_strength, price_shock, range_shock, high_shock, low_shock, volume_shock = \
+            self._draw_day_shocks(total_minutes)
+        
+        price_change, close_price = _mean_reverting_path(start_price, price_shock, vol_pattern, trend_strength)
+        open_price = np.concatenate(([start_price], close_price[:-1]))
+        
+        # OHLC and volume derived in bulk, same arithmetic as the scalar path
+        intrabar_range = np.abs(price_change) + range_shock * (vol_pattern * open_price * 0.3)
+        body_high = np.maximum(open_price, close_price)
+        body_low = np.minimum(open_price, close_price)
+        high_price = np.maximum(body_high + high_shock * (intrabar_range * 0.6), body_high)
+        low_price = np.minimum(body_low - low_shock * (intrabar_range * 0.6), body_low)
+        volume = np.maximum(50000, (volume_pattern * volume_shock).astype(np.int64))
+        
+        timestamps = np.datetime64(start_time, 'us') + np.arange(total_minutes).astype('timedelta64[m]')
+        return pa.Table.from_arrays([
+            pa.array(timestamps, type=pa.timestamp('us')),
+            pa.array(np.full(total_minutes, self.symbol, dtype=object), type=pa.string()),
+            pa.array(np.round(open_price, 2)),
+            pa.array(np.round(high_price, 2)),
+            pa.array(np.round(low_price, 2)),
+            pa.array(np.round(close_price, 2)),
+            pa.array(volume, type=pa.int64()),
+            pa.array(np.full(total_minutes, '1min', dtype=object), type=pa.string()),
+            pa.array(np.full(total_minutes, 'RTH', dtype=object), type=pa.string()),
+        ], schema=BAR_SCHEMA)
+
+BAR_SCHEMA = pa.schema([
+    ('timestamp', pa.timestamp('us')),
+    ('symbol', pa.string()),
+    ('open', pa.float64()),
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('close', pa.float64()),
+    ('volume', pa.int64()),
+    ('bar_type', pa.string()),
+    ('session', pa.string()),
+])
+
+def _mean_reverting_path(start_price, price_shock, vol_pattern, trend_strength):
+    """
+    Close-to-close recurrence over pre-drawn shocks.
+    The mean-reversion pull is quadratic in price, so there is no closed-form cumprod;
+    the recurrence is stepped once over plain floats with no per-bar RNG or dict work.
+    """
+    total_minutes = len(price_shock)
+    price_change = np.empty(total_minutes)
+    close_price = np.empty(total_minutes)
+    current_price = start_price
+    for i, (shock, vol) in enumerate(zip(price_shock.tolist(), vol_pattern.tolist())):
+        change = shock * (vol * current_price) + trend_strength * current_price
+        if i > 60:  # Mean reversion after first hour
+            change = change + (-0.0001 * (current_price - start_price)) * current_price
+        price_change[i] = change
+        current_price = current_price + change
+        close_price[i] = current_price
+    return price_change, close_price
 
 def save_to_parquet(bars, output_path):
-    """Save market data to Parquet format with optimal schema"""
-    df = pd.DataFrame(bars)
+    """Save market data (list of bar dicts or Arrow table) to Parquet format with optimal schema"""
+    df = bars.to_pandas() if isinstance(bars, pa.Table) else pd.DataFrame(bars)
     
     # Optimize data types for storage efficiency
     df['timestamp'] = pd.to_datetime(df['timestamp'])
@@ -141,11 +246,11 @@ def save_to_parquet(bars, output_path):
     metadata = {
         b'generator': b'ODTE Market Data Generator v1.0',
         b'created_at': datetime.now().isoformat().encode(),
-        b'symbol': bars[0]['symbol'].encode(),
+        b'symbol': str(df['symbol'].iloc[0]).encode(),
         b'frequency': b'1min',
         b'timezone': b'US/Eastern',
-        b'total_bars': str(len(bars)).encode(),
-        b'date_range': f"{bars[0]['timestamp'].date()} to {bars[-1]['timestamp'].date()}".encode()
+        b'total_bars': str(len(df)).encode(),
+        b'date_range': f"{df.index[0].date()} to {df.index[-1].date()}".encode()
     }
     
     existing_meta = table.schema.metadata or {}
@@ -163,6 +268,199 @@ def save_to_parquet(bars, output_path):
     
     return df
 
+def stream_to_parquet(batches, output_path, symbol=None):
+    """
+    Write RecordBatches (e.g. MarketDataGenerator.iter_day_batches) to one Parquet file as they arrive.
+    Each batch becomes its own row group and is flushed immediately, so peak memory is one day
+    regardless of horizon. Returns the number of bars written.
+    """
+    metadata = {
+        b'generator': b'ODTE Market Data Generator v1.0',
+        b'created_at': datetime.now().isoformat().encode(),
+        b'frequency': b'1min',
+        b'timezone': b'US/Eastern',
+    }
+    if symbol:
+        metadata[b'symbol'] = symbol.encode()
+    schema = BAR_SCHEMA.with_metadata(metadata)
+    
+    total_bars = 0
+    with pq.ParquetWriter(output_path, schema, compression='snappy', use_dictionary=True) as writer:
+        for batch in batches:
+            writer.write_batch(batch.replace_schema_metadata(metadata))
+            total_bars += batch.num_rows
+    return total_bars
+
+# Hive-partitioned dataset layout: <root>/symbol=SPX/year=2024/month=02/part-20240201-20240229.parquet
+# symbol/year/month live in the path only; <root>/_metadata carries every row group's footer
+# (with timestamp min/max) so readers prune to a date window without opening data files.
+DATASET_SCHEMA = pa.schema([
+    ('timestamp', pa.timestamp('us')),
+    ('open', pa.float64()),   # float64: float32 cannot hold SPX cents exactly
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('close', pa.float64()),
+    ('volume', pa.uint32()),
+    ('bar_type', pa.dictionary(pa.int32(), pa.string())),
+    ('session', pa.dictionary(pa.int32(), pa.string())),
+], metadata={
+    b'generator': b'ODTE Market Data Generator v1.0',
+    b'frequency': b'1min',
+    b'timezone': b'US/Eastern',
+})
+DATASET_PARTITIONING = pa.schema([('symbol', pa.string()), ('year', pa.int32()), ('month', pa.int32())])
+DATASET_ROW_GROUP_SIZE = 390 * 5  # One trading week of minute bars per row group
+
+def partition_dir(symbol, year, month):
+    return f"symbol={symbol}/year={year}/month={month:02d}"
+
+def _as_table(bars):
+    if isinstance(bars, pa.Table):
+        return bars
+    df = bars if isinstance(bars, pd.DataFrame) else pd.DataFrame(bars)
+    if 'timestamp' not in df.columns:
+        df = df.reset_index()
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+def dataset_spans(root):
+    """Existing coverage per partition from _metadata: {partition_dir: (min_ts, max_ts)}"""
+    path = os.path.join(root, '_metadata')
+    if not os.path.exists(path):
+        return {}
+    md = pq.read_metadata(path)
+    ts_col = md.schema.to_arrow_schema().get_field_index('timestamp')
+    spans = {}
+    for i in range(md.num_row_groups):
+        col = md.row_group(i).column(ts_col)
+        part = os.path.dirname(col.file_path)
+        lo, hi = col.statistics.min, col.statistics.max
+        if part in spans:
+            lo, hi = min(lo, spans[part][0]), max(hi, spans[part][1])
+        spans[part] = (lo, hi)
+    return spans
+
+def partition_last_close(root, part):
+    """Close of the latest bar in one partition (None when it has no parts yet)"""
+    part_dir = os.path.join(root, part)
+    files = sorted(f for f in os.listdir(part_dir) if f.endswith('.parquet')) if os.path.isdir(part_dir) else []
+    if not files:
+        return None
+    # part-<first>-<last>.parquet: the latest part ends last, its bars are sorted by timestamp
+    last = max(files, key=lambda f: f.rsplit('-', 1)[-1])
+    closes = pq.read_table(os.path.join(part_dir, last), columns=['close']).column('close')
+    return closes[-1].as_py()
+
+def write_dataset_parts(bars, root):
+    """
+    Write bars into their symbol/year/month partitions as new part files.
+    Existing files are never touched, and a failed call removes the parts it wrote; returns the
+    new parts' paths relative to root.
+    Call update_dataset_metadata() afterwards (workers write parts, the parent owns _metadata).
+    """
+    table = _as_table(bars)
+    ts = pd.DatetimeIndex(table.column('timestamp').to_numpy())
+    symbols = table.column('symbol').to_numpy(zero_copy_only=False).astype(str)
+    keys = pd.DataFrame({'symbol': symbols, 'year': ts.year, 'month': ts.month})
+    data = table.select([f.name for f in DATASET_SCHEMA]).cast(DATASET_SCHEMA)
+
+    written = []
+    for (symbol, year, month), idx in keys.groupby(['symbol', 'year', 'month'], sort=True).indices.items():
+        part = data.take(pa.array(idx)).sort_by('timestamp')
+        first = part.column('timestamp')[0].as_py()
+        last = part.column('timestamp')[-1].as_py()
+        rel_path = f"{partition_dir(symbol, year, month)}/part-{first:%Y%m%d}-{last:%Y%m%d}.parquet"
+        full_path = os.path.join(root, rel_path)
+        if os.path.exists(full_path):
+            raise FileExistsError(f"Partition part already exists: {rel_path}")
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        try:
+            pq.write_table(
+                part,
+                full_path,
+                compression='snappy',
+                row_group_size=DATASET_ROW_GROUP_SIZE,
+                use_dictionary=True
+            )
+        except BaseException:
+            # A failed call leaves no files behind: the half-written part and the ones before it go
+            for path in written + [rel_path]:
+                if os.path.exists(os.path.join(root, path)):
+                    os.remove(os.path.join(root, path))
+            raise
+        written.append(rel_path)
+    return written
+
+def update_dataset_metadata(root, rel_paths):
+    """Append the footers of newly written parts to <root>/_metadata (existing entries are kept)"""
+    if not rel_paths:
+        return
+    summary_path = os.path.join(root, '_metadata')
+    summary = pq.read_metadata(summary_path) if os.path.exists(summary_path) else None
+    for rel_path in rel_paths:
+        md = pq.read_metadata(os.path.join(root, rel_path))
+        md.set_file_path(rel_path)
+        if summary is None:
+            summary = md
+        else:
+            summary.append_row_groups(md)
+
+    tmp_path = summary_path + '.tmp'
+    summary.write_metadata_file(tmp_path)
+    os.replace(tmp_path, summary_path)  # Readers never see a half-written summary
+    pq.write_metadata(DATASET_SCHEMA, os.path.join(root, '_common_metadata'))
+
+def save_to_dataset(bars, root):
+    """
+    Append market data to a hive-partitioned Parquet dataset.
+    Only new days are accepted: bars overlapping a partition's existing coverage are rejected
+    rather than silently duplicated.
+    """
+    table = _as_table(bars)
+    ts = pd.DatetimeIndex(table.column('timestamp').to_numpy())
+    symbols = table.column('symbol').to_numpy(zero_copy_only=False).astype(str)
+    spans = dataset_spans(root)
+    for symbol, year, month in set(zip(symbols, ts.year, ts.month)):
+        part = partition_dir(symbol, year, month)
+        if part in spans:
+            mask = (symbols == symbol) & (ts.year == year) & (ts.month == month)
+            lo, hi = spans[part]
+            if ((ts[mask] >= pd.Timestamp(lo)) & (ts[mask] <= pd.Timestamp(hi))).any():
+                raise ValueError(f"Bars overlap existing data in {part} ({lo} to {hi})")
+
+    rel_paths = write_dataset_parts(table, root)
+    update_dataset_metadata(root, rel_paths)
+    return rel_paths
+
+def read_dataset_window(root, start=None, end=None, symbols=None):
+    """
+    Read a date window from a dataset written by save_to_dataset.
+    Partition and row-group pruning both come from _metadata, so a one-week read
+    only opens the row groups that overlap that week.
+    """
+    import pyarrow.dataset as ds
+    dataset = ds.parquet_dataset(
+        os.path.join(root, '_metadata'),
+        partitioning=ds.partitioning(DATASET_PARTITIONING, flavor='hive')
+    )
+    filt = None
+    def _and(a, b):
+        return b if a is None else a & b
+    if start is not None:
+        start = pd.Timestamp(start)
+        filt = _and(filt, ds.field('timestamp') >= pa.scalar(start.to_pydatetime(), pa.timestamp('us')))
+        filt = _and(filt, (ds.field('year') > start.year) |
+                    ((ds.field('year') == start.year) & (ds.field('month') >= start.month)))
+    if end is not None:
+        end = pd.Timestamp(end)
+        if end == end.normalize():
+            end = end + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)  # Inclusive end date
+        filt = _and(filt, ds.field('timestamp') <= pa.scalar(end.to_pydatetime(), pa.timestamp('us')))
+        filt = _and(filt, (ds.field('year') < end.year) |
+                    ((ds.field('year') == end.year) & (ds.field('month') <= end.month)))
+    if symbols:
+        filt = _and(filt, ds.field('symbol').isin(list(symbols)))
+    return dataset.to_table(filter=filt)
+
 def export_parquet_to_csv(parquet_path, csv_path):
     """
     Export Parquet data to CSV format for debugging/compatibility.
@@ -235,14 +533,14 @@ if __name__ == "__main__":
         (2024, 2, 5)    # Monday (skipping weekend)
     ]
     
-    # Generate market data
-    bars = generator.generate_multi_day_data(test_dates)
+    # Generate market data (vectorized engine; generate_multi_day_data is the scalar reference)
+    bars = generator.generate_multi_day_table(test_dates)
     
     # Save to Parquet (primary format)
     parquet_path = "../Samples/bars_spx_min.parquet"
     df = save_to_parquet(bars, parquet_path)
     
-    print(f"SUCCESS: Saved {len(bars)} bars to Parquet: {parquet_path}")
+    print(f"SUCCESS: Saved {len(df)} bars to Parquet: {parquet_path}")
     
     # Export to CSV for compatibility
     csv_path = "../Samples/bars_spx_min.csv"
@@ -0,0 +1,57 @@
+"""Batch generator sharding: appends continue their month, anchors do not depend on --start, failed runs leave no parts"""
+import os
+from datetime import date
+
+import pytest
+
+from generate_batch_parquet import month_anchors, plan_shards, run_batch, trading_days
+from generate_full_day_parquet import dataset_spans, read_dataset_window
+
+SEED = 212
+
+def generate(root, start, end, symbols=('SPX',)):
+    days = trading_days(start, end, 'weekdays')
+    run_batch(plan_shards(days, list(symbols), SEED, dataset_spans(root), root), root, workers=1)
+
+def day_bars(root, day):
+    return read_dataset_window(root, day, day).sort_by('timestamp')
+
+def test_append_continues_the_month(tmp_path):
+    root = str(tmp_path / 'bars')
+    generate(root, date(2021, 3, 1), date(2021, 3, 17))
+    generate(root, date(2021, 3, 1), date(2021, 3, 18))
+    first, prev, appended = (day_bars(root, d) for d in ('2021-03-01', '2021-03-17', '2021-03-18'))
+    assert appended.num_rows == 390
+    assert appended.column('close').to_pylist() != first.column('close').to_pylist()
+    assert appended.column('open')[0].as_py() == prev.column('close')[-1].as_py()
+
+def test_anchors_do_not_depend_on_start(tmp_path):
+    months = [(2021, m) for m in range(2, 7)]
+    assert month_anchors('SPX', SEED, months) == {
+        ym: a for ym, a in month_anchors('SPX', SEED, [(2019, 1)] + months).items() if ym in months}
+
+    full, late = str(tmp_path / 'full'), str(tmp_path / 'late')
+    generate(full, date(2020, 11, 1), date(2021, 4, 30), ('SPX', 'QQQ'))
+    generate(late, date(2021, 2, 1), date(2021, 4, 30), ('SPX', 'QQQ'))
+    window = lambda root: read_dataset_window(root, '2021-02-01', '2021-04-30').select(
+        ['timestamp', 'symbol', 'open', 'close']).sort_by([('symbol', 'ascending'), ('timestamp', 'ascending')])
+    assert window(full).equals(window(late))
+
+def test_failed_shard_leaves_nothing_behind(tmp_path):
+    root = str(tmp_path / 'bars')
+    shards = plan_shards(trading_days(date(2021, 3, 1), date(2021, 4, 30), 'weekdays'), ['SPX'], SEED)
+    broken = shards[:1] + [dict(shards[1], dates=[(2021, 4, 31)])]
+    with pytest.raises(RuntimeError):
+        run_batch(broken, root, workers=2)
+    assert not [f for _, _, files in os.walk(root) for f in files]
+    run_batch(shards, root, workers=2)  # a rerun does not trip over leftovers
+    assert read_dataset_window(root).num_rows == len(trading_days(date(2021, 3, 1), date(2021, 4, 30), 'weekdays')) * 390
+
+def test_sessions_before_coverage_are_reported(tmp_path, capsys):
+    root = str(tmp_path / 'bars')
+    generate(root, date(2021, 3, 10), date(2021, 3, 17))
+    capsys.readouterr()
+    generate(root, date(2021, 3, 1), date(2021, 3, 18))
+    assert 'skipping 7 earlier session(s)' in capsys.readouterr().out
+    assert day_bars(root, '2021-03-01').num_rows == 0
+    assert day_bars(root, '2021-03-18').num_rows == 390
@@ -0,0 +1,20 @@
+"""Scalar and vectorized engines draw from the same seeded generator and give the same bars"""
+import numpy as np
+import pandas as pd
+
+from generate_full_day_parquet import MarketDataGenerator
+
+DATES = [(2024, 2, 1), (2024, 2, 2), (2024, 2, 5)]
+
+def test_scalar_matches_vectorized():
+    scalar = pd.DataFrame(MarketDataGenerator('SPX', 4951.00, seed=7).generate_multi_day_data(DATES))
+    vectorized = MarketDataGenerator('SPX', 4951.00, seed=7).generate_multi_day_table(DATES, verbose=False).to_pandas()
+    assert len(scalar) == 390 * len(DATES)
+    pd.testing.assert_frame_equal(scalar.astype(vectorized.dtypes.to_dict()), vectorized)
+
+def test_global_numpy_seed_is_ignored():
+    bars = lambda: MarketDataGenerator('SPX', 4951.00, seed=7).generate_multi_day_table(DATES[:1], verbose=False)
+    np.random.seed(0)
+    first = bars()
+    np.random.seed(1)
+    assert bars().equals(first)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+PM212 auditor benchmark.
+Generates synthetic SQLite ledgers at the requested sizes (10^4 .. 10^8 trades) and times every
+audit phase (table detection, trade fetch, timestamp parsing, daily aggregation, guardrail walk,
+NBBO as-of join, slippage, rolling metrics, report) through the same pm212_core calls the
+auditors make. Each size is audited in a fresh interpreter so peak RSS belongs to that run alone.
+Results go to JSON; --baseline compares against an earlier result file and exits 1 on a slowdown.
+
+Shapes:
+  trades      ledger `trades` + `quotes` (text timestamps, option symbols as the quote key)
+  nbbo        ledger `trades` with contract_id + ODTE.Historical `nbbo_quotes` (epoch µs, indexed)
+  trade_logs  ODTE.Backtest TradeLogDatabase `trade_logs` (no quotes: the NBBO phase is skipped)
+
+Underlying minute paths come from MarketDataGenerator (ODTE.Backtest/Scripts); option quotes are
+intrinsic value plus a decaying time value around them, so spreads and fills look like 0DTE data.
+"""
+import argparse, json, os, platform, sqlite3, subprocess, sys, time
+from datetime import datetime
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+from pm212_core import (fetch_trades, trades_from_columns, aggregate_daily, nbbo_join, nbbo_check, rolling_summary,
+                        detect_mapping, guardrail_walk, apply_overrides, readonly_connect, PhaseTimer, peak_rss_bytes)
+
+GENERATOR_DIR = os.path.join(HERE, '..', '..', 'ODTE.Backtest', 'Scripts')
+DAILY_VOL = 0.015  # generate_full_day_parquet.daily_vol
+SHAPES = ('trades', 'nbbo', 'trade_logs')
+SESSION_MINUTES = 390
+OPEN_UTC = np.timedelta64(14 * 60 + 30, 'm')
+TRADES_PER_DAY = 200  # sizes below this many trades per day x MAX_DAYS use fewer days
+MAX_DAYS = 5000       # about 20 years of sessions
+# trade_logs keeps P&L in exit_pnl, which auto-detection does not pick; audits of it pass this as --mapping
+SHAPE_OVERRIDES = {'trade_logs': {'trade_cols': {'realized': 'exit_pnl'}}}
+
+def market_data_generator():
+    """MarketDataGenerator class, or None without pandas/pyarrow (imported only where data is generated)"""
+    sys.path.insert(0, GENERATOR_DIR)
+    try:
+        from generate_full_day_parquet import MarketDataGenerator
+    except ImportError:
+        return None
+    return MarketDataGenerator
+
+def price_paths(days, seed):
+    """One (390,) array of SPX minute closes per trading day (a plain random walk without MarketDataGenerator)"""
+    MarketDataGenerator = market_data_generator()
+    if MarketDataGenerator is not None:
+        dates = [(d.year, d.month, d.day) for d in days.astype(object)]
+        for batch in MarketDataGenerator(seed=seed).iter_day_batches(dates, verbose=False):
+            yield batch.column('close').to_numpy()
+        return
+    rng = np.random.default_rng(seed)
+    price = 4951.0
+    for _ in days:
+        path = price * np.exp(np.cumsum(rng.normal(0, DAILY_VOL / np.sqrt(SESSION_MINUTES), SESSION_MINUTES)))
+        price = path[-1]
+        yield path
+
+def option_mid(spot, strike, call, minute):
+    """Intrinsic value plus a time value that decays to 0 at the close"""
+    intrinsic = np.where(call, np.maximum(spot - strike, 0.0), np.maximum(strike - spot, 0.0))
+    time_value = spot * DAILY_VOL * 0.4 * np.sqrt((SESSION_MINUTES - minute) / SESSION_MINUTES)
+    return np.maximum(intrinsic + time_value, 0.05)
+
+def quote_at(spot, strike, call, minute):
+    mid = option_mid(spot, strike, call, minute)
+    spread = np.maximum(np.round(0.04 * mid, 2), 0.05)
+    bid = np.maximum(np.round(mid - spread / 2, 2), 0.0)
+    return bid, np.round(bid + spread, 2), mid, spread
+
+def create_schema(con, shape):
+    if shape == 'trade_logs':
+        con.executescript("""
+            CREATE TABLE trade_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, symbol TEXT NOT NULL,
+                expiry TEXT NOT NULL, right TEXT NOT NULL, strike DECIMAL(10,2) NOT NULL, spread_type TEXT NOT NULL,
+                max_loss DECIMAL(10,2) NOT NULL, exit_pnl DECIMAL(10,2) NOT NULL, exit_reason TEXT NOT NULL,
+                market_regime TEXT NOT NULL, json_data TEXT NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP);
+            CREATE INDEX idx_trade_logs_timestamp ON trade_logs(timestamp);
+            CREATE INDEX idx_trade_logs_symbol ON trade_logs(symbol);""")
+        return
+    key = 'contract_id INTEGER, ' if shape == 'nbbo' else ''
+    con.execute(f"CREATE TABLE trades (id INTEGER PRIMARY KEY, {key}symbol TEXT, entry_time TEXT, exit_time TEXT, "
+                f"entry_price REAL, exit_price REAL, qty REAL, fees REAL, multiplier REAL, realized_pnl REAL)")
+    if shape == 'nbbo':
+        con.execute("CREATE TABLE nbbo_quotes (id INTEGER PRIMARY KEY AUTOINCREMENT, contract_id INTEGER NOT NULL, "
+                    "timestamp BIGINT NOT NULL, bid REAL NOT NULL, bid_size INTEGER NOT NULL, ask REAL NOT NULL, "
+                    "ask_size INTEGER NOT NULL)")
+    else:
+        con.execute("CREATE TABLE quotes (symbol TEXT, ts TEXT, bid REAL, ask REAL)")
+
+def _text(ts):
+    return np.char.replace(np.datetime_as_string(ts.astype('datetime64[s]')), 'T', ' ')
+
+def generate(path, shape, rows, quotes_per_trade=5, seed=212):
+    """Write a synthetic ledger of `rows` trades (and about rows x quotes_per_trade quotes) to `path`"""
+    rng = np.random.default_rng(seed)
+    n_days = int(min(MAX_DAYS, max(1, rows // TRADES_PER_DAY)))
+    days = np.busday_offset(np.datetime64('2005-01-03'), np.arange(n_days), roll='forward')
+    per_day = np.full(n_days, rows // n_days)
+    per_day[:rows % n_days] += 1
+    tmp = path + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    con = sqlite3.connect(tmp)
+    con.execute("PRAGMA journal_mode=OFF")
+    con.execute("PRAGMA synchronous=OFF")
+    create_schema(con, shape)
+    next_id = 0
+    for day, n, spot in zip(days, per_day, price_paths(days, seed)):
+        if not n:
+            continue
+        # Strikes every 5 points around the open, calls above and puts below
+        n_ct = int(min(200, n // 5 + 2))
+        offset = (np.arange(n_ct) - n_ct // 2) * 5
+        strike = np.round(spot[0] / 5) * 5 + offset
+        call = offset >= 0
+        ids = next_id + np.arange(n_ct)
+        next_id += n_ct
+        label = np.array([f"SPXW {day.astype(object):%y%m%d}{'C' if c else 'P'}{int(k):05d}" for c, k in zip(call, strike)],
+                         dtype=object)
+        open_ts = day.astype('datetime64[us]') + OPEN_UTC
+
+        ct = rng.integers(0, n_ct, n)
+        t_in = rng.integers(1, SESSION_MINUTES - 10, n)
+        t_out = t_in + rng.integers(1, SESSION_MINUTES - t_in)
+        _, _, mid_in, spread_in = quote_at(spot[t_in], strike[ct], call[ct], t_in)
+        mid_out = option_mid(spot[t_out], strike[ct], call[ct], t_out)
+        qty = rng.choice([-5, -3, -2, -1, 1, 2, 3, 5], n).astype(np.float64)
+        side = np.sign(qty)
+        entry = np.maximum(np.round(mid_in + side * spread_in * rng.uniform(-0.6, 0.6, n), 2), 0.01)
+        exit_ = np.maximum(np.round(mid_out - side * 0.02, 2), 0.0)
+        realized = np.round((exit_ - entry) * qty * 100, 2)
+        fees = np.round(np.abs(qty) * 1.30, 2)
+        ts_in = open_ts + t_in.astype('timedelta64[m]') + rng.integers(0, 60, n).astype('timedelta64[s]')
+        ts_out = open_ts + t_out.astype('timedelta64[m]')
+
+        if shape == 'trade_logs':
+            text_in = np.char.add(_text(ts_in), '.000')
+            regime = rng.choice(['calm', 'mixed', 'convex'], n)
+            con.executemany("INSERT INTO trade_logs (timestamp, symbol, expiry, right, strike, spread_type, max_loss, exit_pnl, "
+                            "exit_reason, market_regime, json_data) VALUES (?, 'SPX', ?, ?, ?, 'CreditSpread', ?, ?, ?, ?, '{}')",
+                            zip(text_in.tolist(), [str(day)] * int(n), np.where(call[ct], 'Call', 'Put').tolist(),
+                                strike[ct].tolist(), (np.abs(qty) * 500).tolist(), (realized - fees).tolist(),
+                                np.where(realized > 0, 'ProfitTarget', 'StopLoss').tolist(), regime.tolist()))
+            continue
+
+        # Quotes: every contract at the open and at the start of each trade's minute, the rest at random times
+        extra = max(int(n * quotes_per_trade) - n_ct - n, 0)
+        q_ct = np.concatenate([np.arange(n_ct), ct, rng.integers(0, n_ct, extra)])
+        q_min = np.concatenate([np.zeros(n_ct, dtype=np.int64), t_in, rng.integers(0, SESSION_MINUTES, extra)])
+        q_sec = np.concatenate([np.zeros(n_ct + n, dtype=np.int64), rng.integers(0, 60, extra)])
+        q_bid, q_ask, _, _ = quote_at(spot[q_min], strike[q_ct], call[q_ct], q_min)
+        q_ts = open_ts + q_min.astype('timedelta64[m]') + q_sec.astype('timedelta64[s]')
+        n_q = len(q_ts)
+        null_realized = rng.random(n) < 0.2  # ledgers without realized P&L fall back to prices
+        trade_rows = [label[ct].tolist(), _text(ts_in).tolist(), _text(ts_out).tolist(), entry.tolist(), exit_.tolist(),
+                      qty.tolist(), fees.tolist(), [100.0] * int(n), np.where(null_realized, None, realized).tolist()]
+        if shape == 'nbbo':
+            con.executemany("INSERT INTO trades (contract_id, symbol, entry_time, exit_time, entry_price, exit_price, qty, "
+                            "fees, multiplier, realized_pnl) VALUES (?, 'SPX', ?, ?, ?, ?, ?, ?, ?, ?)",
+                            zip(ids[ct].tolist(), *trade_rows[1:]))
+            size = rng.integers(1, 100, (2, n_q))
+            con.executemany("INSERT INTO nbbo_quotes (contract_id, timestamp, bid, bid_size, ask, ask_size) VALUES (?, ?, ?, ?, ?, ?)",
+                            zip(ids[q_ct].tolist(), q_ts.astype(np.int64).tolist(), q_bid.tolist(), size[0].tolist(),
+                                q_ask.tolist(), size[1].tolist()))
+        else:
+            con.executemany("INSERT INTO trades (symbol, entry_time, exit_time, entry_price, exit_price, qty, fees, "
+                            "multiplier, realized_pnl) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", zip(*trade_rows))
+            con.executemany("INSERT INTO quotes VALUES (?, ?, ?, ?)",
+                            zip(label[q_ct].tolist(), _text(q_ts).tolist(), q_bid.tolist(), q_ask.tolist()))
+    if shape == 'nbbo':
+        con.execute("CREATE INDEX idx_nbbo_lookup ON nbbo_quotes (contract_id, timestamp)")
+    con.commit()
+    con.close()
+    os.replace(tmp, path)
+    return n_days
+
+def run_audit(db, shape, levels, nbbo_mode='auto'):
+    """Audit `db` phase by phase (this process only) and return the PhaseTimer report"""
+    timer = PhaseTimer()
+    con = readonly_connect(db)
+    with timer.phase('detect'):
+        mapping = apply_overrides(detect_mapping(con), SHAPE_OVERRIDES.get(shape))
+    trades_tbl, quotes_tbl, qmap = mapping['trades_table'], mapping['quotes_table'], mapping['quote_cols']
+    with timer.phase('fetch_trades') as ph:
+        raw = fetch_trades(con, trades_tbl, mapping['trade_cols'])
+        ph['rows'] = len(raw[0])
+    with timer.phase('parse', rows=len(raw[0])):
+        trades = trades_from_columns(raw)
+    del raw
+    with timer.phase('daily_agg', rows=len(trades)):
+        agg = aggregate_daily(trades, levels)
+    with timer.phase('guardrail', rows=len(agg.days)):
+        walked, _, _ = guardrail_walk(agg.daily_items())
+        breaches = [{'date': str(day), 'net_pnl': round(pnl, 2), 'allowed': allowed} for day, pnl, allowed, _ in walked]
+    nbbo = None
+    if quotes_tbl and all(qmap.get(k) for k in ('key', 'ts', 'bid', 'ask')):
+        with timer.phase('nbbo_join', rows=len(trades)) as ph:
+            matched, bid, ask, mode = nbbo_join(con, quotes_tbl, qmap, trades.quote_key, trades.entry_ts, nbbo_mode)
+            (checked, within, _), _ = nbbo_check(trades, matched, bid, ask, 0.01)
+            nbbo = {'mode': mode, 'checked': checked, 'within': within}
+    with timer.phase('slippage', rows=len(agg.days) * len(levels)):
+        slippage = {f'${lvl:.2f}': {'profit_factor': agg.trade_pf(j), 'daily_pf': agg.daily_pf(j),
+                                    'net_sum': float(agg.daily_slipped[:, j].sum())} for j, lvl in enumerate(levels)}
+    with timer.phase('rolling', rows=len(agg.days)):
+        rolling = rolling_summary(agg.days, agg.daily_net)
+    with timer.phase('report'):
+        json.dumps({'breaches': breaches, 'nbbo': nbbo, 'slippage': slippage, 'rolling': rolling})
+    con.close()
+    out = timer.report()
+    out.update({'trades': len(trades), 'days': len(agg.days), 'nbbo': nbbo, 'breaches': len(breaches)})
+    return out
+
+def run_main(argv):
+    ap = argparse.ArgumentParser(prog='pm212_bench.py run', description='Audit one database phase by phase (JSON on stdout)')
+    ap.add_argument('db')
+    ap.add_argument('--shape', choices=SHAPES, default='trades')
+    ap.add_argument('--slippage', default='0.05,0.10')
+    ap.add_argument('--nbbo-mode', default='auto')
+    args = ap.parse_args(argv)
+    levels = [float(x) for x in args.slippage.split(',') if x.strip()]
+    print(json.dumps(run_audit(args.db, args.shape, levels, args.nbbo_mode)))
+
+def compare(result, baseline, max_slowdown, min_seconds=0.05):
+    """Phases (and peak RSS) that got more than max_slowdown times worse than the baseline run of the same size"""
+    base = {(r['shape'], r['rows']): r for r in baseline.get('runs', [])}
+    regressions = []
+    for run in result['runs']:
+        old = base.get((run['shape'], run['rows']))
+        if old is None:
+            continue
+        for name, p in run['audit']['phases'].items():
+            q = old['audit']['phases'].get(name)
+            if q and q['seconds'] >= min_seconds and p['seconds'] > q['seconds'] * max_slowdown:
+                regressions.append({'shape': run['shape'], 'rows': run['rows'], 'phase': name,
+                                    'seconds': p['seconds'], 'baseline_seconds': q['seconds']})
+        new_rss, old_rss = run['audit'].get('peak_rss_mb'), old['audit'].get('peak_rss_mb')
+        if new_rss and old_rss and new_rss > old_rss * max_slowdown:
+            regressions.append({'shape': run['shape'], 'rows': run['rows'], 'phase': 'peak_rss_mb',
+                                'value': new_rss, 'baseline': old_rss})
+    return regressions
+
+def main():
+    if sys.argv[1:2] == ['run']:
+        return run_main(sys.argv[2:])
+    ap = argparse.ArgumentParser(description='Benchmark the PM212 auditors on synthetic ledgers.',
+                                 epilog='pm212_bench.py run DB audits an existing database phase by phase.')
+    ap.add_argument('--rows', default='1e4,1e5,1e6', help='Comma-separated trade counts (e.g. 1e4,1e6,1e8)')
+    ap.add_argument('--shape', choices=SHAPES, default='trades', help='Ledger/quote table layout to generate')
+    ap.add_argument('--quotes-per-trade', type=float, default=5.0, help='NBBO quote rows generated per trade')
+    ap.add_argument('--seed', type=int, default=212)
+    ap.add_argument('--workdir', default='pm212_bench_dbs', help='Where generated databases live (reused across runs)')
+    ap.add_argument('--regenerate', action='store_true', help='Rebuild databases even when they exist')
+    ap.add_argument('--discard', action='store_true', help='Delete each database after it has been audited')
+    ap.add_argument('--slippage', default='0.05,0.10', help='Comma-separated per-contract slippage levels ($)')
+    ap.add_argument('--nbbo-mode', choices=['auto', 'memory', 'stream', 'indexed'], default='auto')
+    ap.add_argument('--out', default='pm212_bench.json', help='Output JSON')
+    ap.add_argument('--baseline', default=None, help='Earlier --out file; exit 1 when a phase slowed down')
+    ap.add_argument('--max-slowdown', type=float, default=1.5, help='Allowed time (and peak RSS) ratio against --baseline')
+    args = ap.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    result = {'generated_at': datetime.utcnow().isoformat() + 'Z', 'python': platform.python_version(),
+              'numpy': np.__version__, 'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(),
+              'price_paths': 'MarketDataGenerator' if market_data_generator() else 'random_walk', 'runs': []}
+    for rows in [int(float(x)) for x in args.rows.split(',') if x.strip()]:
+        db = os.path.join(args.workdir, f'{args.shape}_{rows}_{args.quotes_per_trade:g}q_{args.seed}.db')
+        gen_seconds = None
+        if args.regenerate or not os.path.exists(db):
+            t0 = time.perf_counter()
+            generate(db, args.shape, rows, args.quotes_per_trade, args.seed)
+            gen_seconds = round(time.perf_counter() - t0, 2)
+        # Fresh interpreter per size: peak RSS then covers this audit only
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), 'run', db, '--shape', args.shape,
+                               '--slippage', args.slippage, '--nbbo-mode', args.nbbo_mode],
+                              stdout=subprocess.PIPE, check=True, text=True)
+        audit = json.loads(proc.stdout)
+        run = {'shape': args.shape, 'rows': rows, 'db_mb': round(os.path.getsize(db) / 1024 / 1024, 1),
+               'generate_seconds': gen_seconds, 'audit': audit}
+        result['runs'].append(run)
+        phases = ', '.join(f"{k} {v['seconds']:.2f}s" for k, v in audit['phases'].items())
+        print(f"{args.shape} {rows:>11,} trades: {audit['total_seconds']:.2f}s, peak {audit['peak_rss_mb']} MB ({phases})",
+              file=sys.stderr)
+        if args.discard:
+            os.remove(db)
+    result['bench_peak_rss_mb'] = round((peak_rss_bytes() or 0) / 1024 / 1024, 1) or None
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            result['regressions'] = compare(result, json.load(f), args.max_slowdown)
+    with open(args.out, 'w') as f:
+        json.dump(result, f, indent=2)
+    for r in result.get('regressions', []):
+        print(f"REGRESSION: {json.dumps(r)}", file=sys.stderr)
+    if result.get('regressions'):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
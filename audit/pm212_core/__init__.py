@@ -0,0 +1,20 @@
+"""Shared building blocks for the PM212 auditors (pm212_audit.py, runAgentAudit/pm212_prepaper_agent.py)."""
+from .timeparse import parse_timestamps, to_epoch_us, as_epoch_us, sniff_format, day_bounds_us, NAT_US
+from .loader import (TradeColumns, load_trades, fetch_trades, trades_from_columns, fetch_columns, trade_select_sql, quote_ident, has_rowid,
+                     QUOTES_SCHEMA, split_table, quote_table, attached_table, pragma, attach_quotes)
+from .aggregate import DailyAggregate, aggregate_daily
+from .asof import (QuoteIndex, load_quote_index, load_quote_window, window_asof_join, stream_asof_join, probe_asof_join,
+                   choose_nbbo_mode, resolve_nbbo_mode, find_quote_index, create_quote_index, quote_index_ddl,
+                   native_ts_values, epoch_unit_sql, sql_time_order, nbbo_join, nbbo_check, nbbo_outlier)
+from .shard import readonly_connect, time_shards, shard_where, range_where
+from .checkpoint import checkpoint_path, load_checkpoint, save_checkpoint, aggregate_state, aggregate_from_state
+from .detect import detect_mapping, detect_table, table_columns, pick, map_columns
+from .ledger import Ledger
+from .parquet import is_parquet, parquet_columns, parquet_mapping, fetch_parquet_trades, load_parquet_quotes
+from .schema import schema_hash, cached_mapping, apply_overrides, default_cache_path
+from .guardrail import GuardrailTracker, guardrail_walk
+from .rolling import RollingWindow, rolling_series, period_metrics, rolling_summary
+from .bootstrap import block_bootstrap, bootstrap_summary, confidence_interval
+from .refill import Refill, load_profiles, refill_entries, refill_summary
+from .quotecache import build_quote_cache, open_quote_cache, cache_status, default_cache_dir, read_cache_meta
+from .perf import PhaseTimer, rss_bytes, peak_rss_bytes
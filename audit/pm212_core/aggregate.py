@@ -0,0 +1,86 @@
+"""
+Fused daily aggregation: base daily P&L and every slippage scenario from one group-by.
+Slippage is linear in contracts (level * |qty| * multiplier), so each extra level costs one
+column of an outer product instead of another walk over the trades.
+"""
+import numpy as np
+
+TRADE_CHUNK = 65536
+
+class DailyAggregate:
+    """Per-day totals plus per-level slippage results for one set of trades"""
+
+    def __init__(self, days, daily_net, levels, daily_slipped, trade_wins, trade_losses,
+                 trade_gross_win, trade_gross_loss, daily_units=None):
+        self.days = days                    # datetime64[D], sorted unique
+        self.daily_net = daily_net          # float64 (n_days,)
+        self.daily_units = daily_units      # float64 (n_days,), contracts x multiplier
+        self.levels = levels                # float64 (n_levels,), $ per contract
+        self.daily_slipped = daily_slipped  # float64 (n_days, n_levels)
+        self.trade_wins = trade_wins        # int64 (n_levels,), trades with P&L > 0 after slippage
+        self.trade_losses = trade_losses
+        self.trade_gross_win = trade_gross_win
+        self.trade_gross_loss = trade_gross_loss
+
+    @classmethod
+    def merge(cls, parts):
+        """
+        Combine aggregates over disjoint trade sets (e.g. per-year shards), folded in the given order.
+        A day present in one part only keeps its exact sum, so shards split on day boundaries
+        reproduce the single-pass result bit for bit.
+        """
+        levels = parts[0].levels
+        days, inverse = np.unique(np.concatenate([p.days for p in parts]), return_inverse=True)
+        daily_net = np.bincount(inverse, weights=np.concatenate([p.daily_net for p in parts]), minlength=len(days))
+        daily_units = np.bincount(inverse, weights=np.concatenate([p.daily_units for p in parts]), minlength=len(days))
+        daily_slipped = daily_net[:, None] - daily_units[:, None] * levels[None, :]
+        total = lambda attr: np.sum([getattr(p, attr) for p in parts], axis=0)
+        return cls(days, daily_net, levels, daily_slipped, total('trade_wins'), total('trade_losses'),
+                   total('trade_gross_win'), total('trade_gross_loss'), daily_units)
+
+    def daily_items(self):
+        """[(datetime.date, net)] in day order, the shape the guardrail walk consumes"""
+        return list(zip(self.days.astype(object), self.daily_net.tolist()))
+
+    def daily_pf(self, j):
+        """Profit factor on daily aggregates for slippage level j (None when no losing day)"""
+        col = self.daily_slipped[:, j]
+        losses = -col[col < 0].sum()
+        return float(col[col > 0].sum() / losses) if losses > 0 else None
+
+    def trade_pf(self, j):
+        """Profit factor on individual trades for slippage level j (None when no losing trade)"""
+        loss = self.trade_gross_loss[j]
+        return float(self.trade_gross_win[j] / loss) if loss > 0 else None
+
+def aggregate_daily(trades, levels=(), mask=None):
+    """
+    Group trades by entry day in one pass. `mask` selects the trades to include
+    (default: every trade with a parseable entry time).
+    """
+    levels = np.asarray(levels, dtype=np.float64)
+    if mask is None:
+        mask = ~np.isnat(trades.entry_ts)
+    day = trades.entry_day()[mask]
+    net = trades.net_pnl()[mask]
+    units = np.abs(trades.qty[mask]) * trades.mult[mask]  # contracts x multiplier
+
+    days, inverse = np.unique(day, return_inverse=True)
+    daily_net = np.bincount(inverse, weights=net, minlength=len(days))
+    daily_units = np.bincount(inverse, weights=units, minlength=len(days))
+    daily_slipped = daily_net[:, None] - daily_units[:, None] * levels[None, :]
+
+    # Per-trade win/loss stats need the trade x level matrix; chunk it to bound memory
+    wins = np.zeros(len(levels), dtype=np.int64)
+    losses = np.zeros(len(levels), dtype=np.int64)
+    gross_win = np.zeros(len(levels))
+    gross_loss = np.zeros(len(levels))
+    for lo in range(0, len(net), TRADE_CHUNK):
+        r = net[lo:lo + TRADE_CHUNK, None] - units[lo:lo + TRADE_CHUNK, None] * levels[None, :]
+        pos, neg = r > 0, r < 0
+        wins += pos.sum(axis=0)
+        losses += neg.sum(axis=0)
+        gross_win += np.where(pos, r, 0.0).sum(axis=0)
+        gross_loss -= np.where(neg, r, 0.0).sum(axis=0)
+
+    return DailyAggregate(days, daily_net, levels, daily_slipped, wins, losses, gross_win, gross_loss, daily_units)
@@ -0,0 +1,497 @@
+"""
+As-of join of trades against NBBO quotes.
+Quotes are sorted once by (key, time) into typed arrays with per-key offsets; every trade is
+then resolved with one searchsorted per traded key instead of a Python binary search per trade.
+Works for the ledger `quotes` shape (symbol + text/epoch-second ts) and for ODTE.Historical
+`nbbo_quotes` (contract_id + BIGINT epoch microseconds).
+"""
+import json, sys
+import numpy as np
+from .loader import fetch_columns, quote_ident, quote_table, split_table, pragma, has_rowid
+from .timeparse import parse_timestamps, as_epoch_us, epoch_unit_of, NAT_US
+from .perf import PhaseTimer
+
+def _key_array(values):
+    """Narrow an object column to a native dtype (str/int) when it is homogeneous"""
+    values = np.asarray(values)
+    if values.dtype != object or values.size == 0:
+        return values
+    narrowed = np.asarray(values.tolist())
+    return narrowed if narrowed.dtype.kind in 'iuU' else values
+
+class QuoteIndex:
+    """Quotes grouped per key: rows keys[k] live in [offsets[k], offsets[k+1]) sorted by ts"""
+
+    def __init__(self, keys, offsets, ts, bid, ask):
+        self.keys = keys        # sorted unique quote keys
+        self.offsets = offsets  # int64 (len(keys)+1,)
+        self.ts = ts            # int64 epoch microseconds
+        self.bid = bid          # float64
+        self.ask = ask
+
+    def __len__(self):
+        return len(self.ts)
+
+    @classmethod
+    def build(cls, key, ts, bid, ask):
+        """key: quote key per row; ts: datetime64[us] or int64 µs (NaT rows and NULL keys are dropped)"""
+        ts = as_epoch_us(ts)
+        key = np.asarray(key, dtype=object)
+        keep = (ts != NAT_US) & (key != None)  # noqa: E711 (elementwise None test)
+        key = _key_array(key[keep])
+        ts, bid, ask = ts[keep], np.asarray(bid, dtype=np.float64)[keep], np.asarray(ask, dtype=np.float64)[keep]
+
+        keys, codes = np.unique(key, return_inverse=True)
+        order = np.lexsort((ts, codes))  # stable: equal timestamps keep table order
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(keys)), out=offsets[1:])
+        return cls(keys, offsets, ts[order], bid[order], ask[order])
+
+    def asof(self, key, ts):
+        """
+        Row index of the last quote with the same key and quote ts <= ts, or -1.
+        key: per-trade keys; ts: datetime64[us] or int64 µs (NaT never matches).
+        """
+        ts = as_epoch_us(ts)
+        key = np.asarray(key, dtype=object)
+        out = np.full(len(ts), -1, dtype=np.int64)
+        valid = np.flatnonzero((ts != NAT_US) & (key != None))  # noqa: E711
+        if not valid.size or not len(self.keys):
+            return out
+
+        tkey = _key_array(key[valid])
+        if tkey.dtype.kind != self.keys.dtype.kind and not (tkey.dtype.kind in 'iu' and self.keys.dtype.kind in 'iu'):
+            tkey, qkeys = tkey.astype(object), self.keys.astype(object)
+        else:
+            qkeys = self.keys
+        try:
+            code = np.searchsorted(qkeys, tkey)
+        except TypeError:
+            return out  # incomparable key types (e.g. ints vs strings): nothing can match
+        code = np.minimum(code, len(qkeys) - 1)
+        hit = qkeys[code] == tkey
+        valid, code = valid[hit], code[hit]
+
+        # One searchsorted per traded key over that key's contiguous quote block
+        order = np.argsort(code, kind='stable')
+        valid, code = valid[order], code[order]
+        bounds = np.flatnonzero(np.diff(code)) + 1
+        for grp in np.split(np.arange(len(code)), bounds):
+            if not grp.size:
+                continue
+            k = code[grp[0]]
+            lo, hi = self.offsets[k], self.offsets[k + 1]
+            pos = np.searchsorted(self.ts[lo:hi], ts[valid[grp]], side='right') - 1
+            out[valid[grp]] = np.where(pos >= 0, lo + pos, -1)
+        return out
+
+    def join(self, key, ts):
+        """(matched mask, bid, ask) per trade; bid/ask are NaN where no quote precedes the trade"""
+        idx = self.asof(key, ts)
+        matched = idx >= 0
+        bid = np.where(matched, self.bid[np.maximum(idx, 0)], np.nan) if len(self) else np.full(len(idx), np.nan)
+        ask = np.where(matched, self.ask[np.maximum(idx, 0)], np.nan) if len(self) else np.full(len(idx), np.nan)
+        return matched, bid, ask
+
+def load_quote_index(con, table, cols):
+    """
+    Read the quotes table once into a QuoteIndex. `cols` maps key/ts/bid/ask to physical columns.
+    Numeric timestamps are read as epochs with the unit inferred from magnitude (µs for nbbo_quotes).
+    """
+    sql = (f"SELECT {quote_ident(cols['key'])}, {quote_ident(cols['ts'])}, "
+           f"COALESCE(CAST({quote_ident(cols['bid'])} AS REAL), 0.0), "
+           f"COALESCE(CAST({quote_ident(cols['ask'])} AS REAL), 0.0) FROM {quote_table(table)}")
+    key, ts_raw, bid, ask = fetch_columns(con, sql)
+    return QuoteIndex.build(key, parse_timestamps(ts_raw, epoch_unit='auto'), bid.astype(np.float64), ask.astype(np.float64))
+
+def load_quote_window(con, table, cols, lo, hi, unit=None, lookback=None, keys=None):
+    """
+    QuoteIndex for trades timed in [lo, hi] (int64 µs): the quotes in that window plus, per key,
+    the latest quote before it, so as-of results match load_quote_index without reading the whole
+    table into memory. With `lookback` (µs) that latest quote is only searched for in the lookback
+    before the window, so a narrow audit never scans older history. `keys` restricts both reads to
+    those quote keys. `unit` pins the epoch unit of numeric ts columns (default: inferred over the
+    column). Like the stream path, relies on SQLite ordering of ts matching time order.
+    """
+    unit = unit or epoch_unit_sql(con, table, cols['ts'])
+    second = 1_000_000
+    edges = [lo // second * second, (hi // second + 1) * second]
+    if lookback is not None:
+        edges.append((lo - lookback) // second * second)
+    bounds = native_ts_values(con, table, cols['ts'], np.array(edges), unit)
+    if bounds is None:
+        return QuoteIndex.build([], np.array([], dtype=np.int64), [], [])
+    q, k_col, t_col = quote_table(table), quote_ident(cols['key']), quote_ident(cols['ts'])
+    values = (f"q.{k_col}, q.{t_col}, COALESCE(CAST(q.{quote_ident(cols['bid'])} AS REAL), 0.0), "
+              f"COALESCE(CAST(q.{quote_ident(cols['ask'])} AS REAL), 0.0)")
+    order = " ORDER BY q.rowid" if has_rowid(con, table) else ""
+    only, only_params = "", []
+    if keys is not None:
+        only, only_params = f" AND {k_col} IN (SELECT value FROM json_each(?))", [json.dumps(list(keys))]
+    # Latest time per key before the window; every row at that time comes back, ties keep table order
+    since = f" AND {t_col} >= ?" if lookback is not None else ""
+    carry = fetch_columns(con, f"SELECT {values} FROM {q} q JOIN (SELECT {k_col} AS k, MAX({t_col}) AS m FROM {q} "
+                               f"WHERE {t_col} < ?{since}{only} AND {k_col} IS NOT NULL GROUP BY {k_col}) c "
+                               f"ON q.{k_col} = c.k AND q.{t_col} = c.m{order}", bounds[:1] + bounds[2:] + only_params)
+    window = fetch_columns(con, f"SELECT {values} FROM {q} q WHERE q.{t_col} >= ? AND q.{t_col} < ?{only} "
+                                f"AND q.{k_col} IS NOT NULL{order}", bounds[:2] + only_params)
+    key, ts_raw, bid, ask = (np.concatenate(pair) for pair in zip(carry, window))
+    return QuoteIndex.build(key, parse_timestamps(ts_raw, epoch_unit=unit), bid.astype(np.float64), ask.astype(np.float64))
+
+def window_asof_join(con, table, cols, key, ts, unit=None, lookback=None):
+    """
+    load_quote_window(...).join(key, ts) over the trades' own time span. Trades the `lookback`
+    leaves without a quote are joined again over their keys' full history, so the result is the
+    same with or without it.
+    """
+    ts = as_epoch_us(ts)
+    ok = ts != NAT_US
+    if not ok.any():
+        return np.zeros(len(ts), dtype=bool), np.full(len(ts), np.nan), np.full(len(ts), np.nan)
+    lo, hi = int(ts[ok].min()), int(ts[ok].max())
+    unit = unit or epoch_unit_sql(con, table, cols['ts'])
+    matched, bid, ask = load_quote_window(con, table, cols, lo, hi, unit, lookback).join(key, ts)
+    key = np.asarray(key, dtype=object)
+    redo = np.flatnonzero(~matched & ok & (key != None)) if lookback is not None else []  # noqa: E711
+    if len(redo):
+        keys = {k.item() if isinstance(k, np.generic) else k for k in key[redo]}
+        index = load_quote_window(con, table, cols, lo, hi, unit, keys=keys)
+        matched[redo], bid[redo], ask[redo] = index.join(key[redo], ts[redo])
+    return matched, bid, ask
+
+STREAM_CHUNK = 250000
+
+ORDER_SAMPLE = 1000
+_UNORDERED_WARNED = set()
+
+def _edge_values(con, table, ts_col, sample=ORDER_SAMPLE):
+    """Non-NULL ts values of the first and last `sample` rows (table order; any `2 * sample` rows without a rowid)"""
+    q, t = quote_table(table), quote_ident(ts_col)
+    order = ("rowid", "rowid DESC") if has_rowid(con, table) else ("", "")
+    values = []
+    for direction in order:
+        by = f" ORDER BY {direction}" if direction else ""
+        values += [r[0] for r in con.execute(f"SELECT {t} FROM {q} WHERE {t} IS NOT NULL{by} LIMIT ?", (sample,))]
+    return values
+
+def epoch_unit_sql(con, table, ts_col, sample=ORDER_SAMPLE):
+    """
+    Epoch unit for a numeric ts column from the largest magnitude among the rows sql_time_order
+    samples. The SQL paths only run on columns those rows show to hold one unit, so this costs two
+    short rowid scans instead of a pass over the column.
+    """
+    nums = [abs(v) for v in _edge_values(con, table, ts_col, sample) if isinstance(v, (int, float))]
+    return epoch_unit_of(max(nums, default=0))
+
+def _ts_layout(v):
+    """Storage kind of one raw ts value: the epoch unit, or the text layout SQLite compares character by character"""
+    if isinstance(v, (int, float)):
+        return epoch_unit_of(abs(v))
+    s = str(v)
+    if s[4:5] not in ('-', '/') or s[7:8] != s[4:5]:
+        return 'text'  # numeric text or free-form: byte order is not time order
+    tail = s[19:]
+    return s[4], ('+' in tail or '-' in tail or 'Z' in tail)
+
+def sql_time_order(con, table, ts_col, sample=ORDER_SAMPLE):
+    """
+    True when SQLite's ordering of the raw ts column can stand in for time order: the first and
+    last `sample` rows all hold epochs of one unit, or naive ISO text with one date separator and
+    one date/time separator. Mixed epoch/ISO columns, mixed units, numeric text and UTC offsets
+    fail; the stream, window, indexed and sharded paths then cannot compare raw values.
+    """
+    values = _edge_values(con, table, ts_col, sample)
+    layouts = {_ts_layout(v) for v in values}
+    if len(layouts) > 1 or 'text' in layouts or any(isinstance(k, tuple) and k[1] for k in layouts):
+        return False
+    separators = {str(v)[10] for v in values if isinstance(v, str) and len(v) > 10}
+    return len(separators) <= 1
+
+def stream_asof_join(con, table, cols, key, ts, chunk=STREAM_CHUNK, unit=None):
+    """
+    Out-of-core equivalent of load_quote_index(...).join(key, ts).
+    Trades are grouped per key and sorted by time; quotes are streamed ORDER BY key, ts with
+    fetchmany and merge-walked against them, so memory is bounded by `chunk` quote rows plus the
+    trades. Relies on SQLite ordering of the ts column matching time order (true for numeric
+    epochs and uniformly formatted ISO text). `unit` as in load_quote_window.
+    """
+    ts = as_epoch_us(ts)
+    key = np.asarray(key, dtype=object)
+    n = len(ts)
+    matched = np.zeros(n, dtype=bool)
+    bid_out = np.full(n, np.nan)
+    ask_out = np.full(n, np.nan)
+
+    # Trades per key, time-sorted (stable, so equal times keep ledger order)
+    valid = np.flatnonzero((ts != NAT_US) & (key != None))  # noqa: E711
+    groups = {}
+    for i in valid[np.argsort(ts[valid], kind='stable')]:
+        groups.setdefault(key[i], []).append(i)
+    groups = {k: np.asarray(v, dtype=np.int64) for k, v in groups.items()}
+    if not groups:
+        return matched, bid_out, ask_out
+
+    unit = unit or epoch_unit_sql(con, table, cols['ts'])
+    k_col, t_col = quote_ident(cols['key']), quote_ident(cols['ts'])
+    order = f"{k_col}, {t_col}"
+    if has_rowid(con, table):
+        order += ", rowid"  # table order on equal timestamps, like the stable in-memory sort
+    sql = (f"SELECT {k_col}, {t_col}, COALESCE(CAST({quote_ident(cols['bid'])} AS REAL), 0.0), "
+           f"COALESCE(CAST({quote_ident(cols['ask'])} AS REAL), 0.0) FROM {quote_table(table)} "
+           f"WHERE {k_col} IS NOT NULL ORDER BY {order}")
+    cur = con.cursor()
+    cur.row_factory = None
+    cur.execute(sql)
+
+    pointer = {}      # key -> number of its trades already resolved
+    last_quote = {}   # key -> (bid, ask) of the latest quote seen so far
+    current = None
+
+    def _finish(k):
+        """All quotes for k have been seen: its remaining trades take the last quote"""
+        trades_k = groups.get(k)
+        if trades_k is None or k not in last_quote:
+            return
+        rest = trades_k[pointer.get(k, 0):]
+        matched[rest] = True
+        bid_out[rest], ask_out[rest] = last_quote[k]
+        pointer[k] = len(trades_k)
+
+    while True:
+        rows = cur.fetchmany(chunk)
+        if not rows:
+            break
+        q_key, q_ts_raw, q_bid, q_ask = (np.array(c, dtype=object) for c in zip(*rows))
+        q_ts = parse_timestamps(q_ts_raw, epoch_unit=unit).astype(np.int64)
+        q_bid, q_ask = q_bid.astype(np.float64), q_ask.astype(np.float64)
+        ok = q_ts != NAT_US
+        q_key, q_ts, q_bid, q_ask = q_key[ok], q_ts[ok], q_bid[ok], q_ask[ok]
+
+        starts = np.concatenate(([0], np.flatnonzero(q_key[1:] != q_key[:-1]) + 1, [len(q_key)]))
+        for lo, hi in zip(starts[:-1], starts[1:]):
+            if lo == hi:
+                continue
+            k = q_key[lo]
+            if k != current:
+                if current is not None:
+                    _finish(current)
+                current = k
+            trades_k = groups.get(k)
+            if trades_k is None:
+                continue
+            seg_ts = q_ts[lo:hi]
+            p = pointer.get(k, 0)
+            t = ts[trades_k[p:]]
+            # Trades strictly before the segment's last quote are settled; ties wait, a later chunk may repeat that time
+            upto = np.searchsorted(t, seg_ts[-1], side='left')
+            pos = np.searchsorted(seg_ts, t[:upto], side='right') - 1
+            idx = trades_k[p:p + upto]
+            inside = pos >= 0
+            matched[idx[inside]] = True
+            bid_out[idx[inside]] = q_bid[lo + pos[inside]]
+            ask_out[idx[inside]] = q_ask[lo + pos[inside]]
+            if k in last_quote and (~inside).any():  # before this segment: carried quote from the last chunk
+                early = idx[~inside]
+                matched[early] = True
+                bid_out[early], ask_out[early] = last_quote[k]
+            pointer[k] = p + upto
+            last_quote[k] = (q_bid[hi - 1], q_ask[hi - 1])
+    if current is not None:
+        _finish(current)
+    return matched, bid_out, ask_out
+
+# Cost model for choosing between a full quote scan and indexed probes: one probe (B-tree descent,
+# random pages) costs roughly this many sequentially scanned quote rows.
+PROBE_COST_ROWS = 20
+
+def find_quote_index(con, table, key_col, ts_col):
+    """
+    Name of an index on `table` whose columns are exactly (key_col, ts_col), or None.
+    Longer indexes would need a sort for the rowid tie-break, so they do not qualify.
+    """
+    schema = split_table(table)[0]
+    for row in con.execute(pragma('index_list', table)).fetchall():
+        name = row[1]
+        cols = [r[2].lower() for r in con.execute(pragma('index_info', f"{schema}.{name}" if schema else name)).fetchall() if r[2]]
+        if cols == [key_col.lower(), ts_col.lower()]:
+            return name
+    return None
+
+def quote_index_ddl(table, cols):
+    """
+    Index the indexed probe path wants. (key, ts) entries carry the rowid, so the probe subquery
+    (latest rowid for key at or before ts, ties broken by rowid) is answered from the index alone.
+    An index on an attached quotes table is created in that database (SQLite names the schema on
+    the index, not the table).
+    """
+    schema, bare = split_table(table)
+    name = f"idx_{bare}_{cols['key']}_{cols['ts']}_asof"
+    name = quote_table(f"{schema}.{name}" if schema else name)
+    return (f"CREATE INDEX IF NOT EXISTS {name} ON {quote_ident(bare)} "
+            f"({quote_ident(cols['key'])}, {quote_ident(cols['ts'])})")
+
+def create_quote_index(con, table, cols):
+    con.execute(quote_index_ddl(table, cols))
+    con.commit()
+
+def estimate_rows(con, table):
+    """Cheap row estimate: MAX(rowid) is a single B-tree descent; COUNT(*) only for WITHOUT ROWID tables"""
+    if has_rowid(con, table):
+        return con.execute(f"SELECT MAX(rowid) FROM {quote_table(table)}").fetchone()[0] or 0
+    return con.execute(f"SELECT COUNT(*) FROM {quote_table(table)}").fetchone()[0]
+
+def choose_nbbo_mode(con, table, cols, n_trades):
+    """
+    'indexed' when a (key, ts) index exists and the audit is sparse enough that per-trade probes
+    beat reading every quote; otherwise 'memory' (full scan + sort).
+    """
+    if find_quote_index(con, table, cols['key'], cols['ts']) is None:
+        return 'memory'
+    return 'indexed' if n_trades * PROBE_COST_ROWS < estimate_rows(con, table) else 'memory'
+
+def native_ts_values(con, table, ts_col, ts, unit=None):
+    """
+    Times (int64 µs) rendered in the ts column's storage format, so comparisons run on the raw
+    column and index range scans apply. Text is rendered to whole seconds, with the microseconds
+    appended when a time has a fraction (ISO text orders a shorter fraction first, so this compares
+    right against any stored precision); numeric columns use `unit`, or the unit inferred over the
+    column when it is None. None for an all-NULL column.
+    """
+    sample = con.execute(f"SELECT {quote_ident(ts_col)} FROM {quote_table(table)} "
+                         f"WHERE {quote_ident(ts_col)} IS NOT NULL LIMIT 1").fetchone()
+    if sample is None:
+        return None
+    sample = sample[0]
+    if isinstance(sample, (int, float)):
+        unit = unit or epoch_unit_sql(con, table, ts_col)
+        if unit == 'us':
+            return ts.tolist()
+        return (ts / (1_000 if unit == 'ms' else 1_000_000)).tolist()
+    us = ts.astype('datetime64[us]')
+    text = np.datetime_as_string(us, unit='us')  # YYYY-MM-DDTHH:MM:SS.ffffff
+    text = np.where(us == us.astype('datetime64[s]'), text.astype('U19'), text)  # whole seconds without '.000000'
+    sample = str(sample)
+    if sample[4:5] == '/':
+        text = np.char.replace(text, '-', '/')
+    if sample[10:11] != 'T':
+        text = np.char.replace(text, 'T', ' ')
+    return text.tolist()
+
+def probe_asof_join(con, table, cols, key, ts, unit=None):
+    """
+    Indexed equivalent of load_quote_index(...).join(key, ts): every trade becomes one
+    `key = ? AND ts <= ? ORDER BY ts DESC LIMIT 1` probe, run inside SQLite against a temp table of
+    trades so the loop never returns to Python. Needs a (key, ts) index to be fast.
+    Text timestamps are compared in the column's own format; `unit` as in load_quote_window.
+    """
+    ts = as_epoch_us(ts)
+    key = np.asarray(key, dtype=object)
+    n = len(ts)
+    matched = np.zeros(n, dtype=bool)
+    bid_out = np.full(n, np.nan)
+    ask_out = np.full(n, np.nan)
+    valid = np.flatnonzero((ts != NAT_US) & (key != None))  # noqa: E711
+    params = native_ts_values(con, table, cols['ts'], ts[valid], unit) if valid.size else None
+    if params is None:
+        return matched, bid_out, ask_out
+
+    q, k_col, t_col = quote_table(table), quote_ident(cols['key']), quote_ident(cols['ts'])
+    bid_expr = f"COALESCE(CAST(q.{quote_ident(cols['bid'])} AS REAL), 0.0)"
+    ask_expr = f"COALESCE(CAST(q.{quote_ident(cols['ask'])} AS REAL), 0.0)"
+    in_transaction = con.in_transaction
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS _pm212_probe (i INTEGER PRIMARY KEY, k, t)")
+    con.execute("DELETE FROM _pm212_probe")
+    con.executemany("INSERT INTO _pm212_probe VALUES (?, ?, ?)", zip(valid.tolist(), key[valid].tolist(), params))
+    if has_rowid(con, table):
+        sql = (f"SELECT p.i, {bid_expr}, {ask_expr} FROM _pm212_probe p JOIN {q} q ON q.rowid = "
+               f"(SELECT rowid FROM {q} WHERE {k_col} = p.k AND {t_col} <= p.t "
+               f"ORDER BY {t_col} DESC, rowid DESC LIMIT 1)")
+    else:
+        inner = f"FROM {q} q WHERE q.{k_col} = p.k AND q.{t_col} <= p.t ORDER BY q.{t_col} DESC LIMIT 1"
+        sql = f"SELECT * FROM (SELECT p.i, (SELECT {bid_expr} {inner}) b, (SELECT {ask_expr} {inner}) a FROM _pm212_probe p) WHERE b IS NOT NULL"
+    cur = con.cursor()
+    cur.row_factory = None
+    rows = cur.execute(sql).fetchall()
+    con.execute("DELETE FROM _pm212_probe")
+    if not in_transaction:
+        con.commit()  # end the implicit transaction the temp-table writes opened, releasing the read snapshot
+    if rows:
+        idx, bid, ask = (np.array(c) for c in zip(*rows))
+        matched[idx] = True
+        bid_out[idx] = bid
+        ask_out[idx] = ask
+    return matched, bid_out, ask_out
+
+def resolve_nbbo_mode(con, table, cols, n_trades, mode='auto', create_index=False):
+    """
+    Concrete join strategy for `mode`. With create_index the (key, ts) index is built first when
+    missing; without it an indexed request falls back to 'memory' and a hint is printed. Columns
+    whose SQL order is not time order (see sql_time_order) always resolve to 'memory'.
+    """
+    if mode != 'memory' and not sql_time_order(con, table, cols['ts']):
+        if mode != 'auto' and (table, cols['ts']) not in _UNORDERED_WARNED:
+            _UNORDERED_WARNED.add((table, cols['ts']))
+            print(f"WARNING: {table}.{cols['ts']} mixes timestamp formats or units, so SQLite cannot order it by time; "
+                  f"joining quotes in memory instead of '{mode}'", file=sys.stderr)
+        return 'memory'
+    if mode in ('auto', 'indexed') and find_quote_index(con, table, cols['key'], cols['ts']) is None:
+        if create_index:
+            create_quote_index(con, table, cols)
+        else:
+            if mode == 'indexed' or n_trades * PROBE_COST_ROWS < estimate_rows(con, table):
+                schema, bare = split_table(table)
+                print(f"HINT: indexed quote probes need an index; create it with --create-index or"
+                      f"{' (in the quotes database)' if schema else ''}:\n  {quote_index_ddl(bare, cols)};", file=sys.stderr)
+            mode = 'memory'
+    if mode == 'auto':
+        mode = choose_nbbo_mode(con, table, cols, n_trades)
+    return mode
+
+def nbbo_join(con, table, cols, key, ts, mode='auto', chunk=STREAM_CHUNK, create_index=False, cache=None, timer=None,
+              lookback=None, unit=None):
+    """
+    As-of join trades to quotes with the requested strategy ('auto', 'memory', 'stream', 'indexed',
+    see resolve_nbbo_mode, or 'window' for quotes in the trades' time span only). `cache` is an
+    already built QuoteIndex (e.g. the memory-mapped quote cache); it replaces the auto, memory and
+    window reads. `lookback` (µs) bounds how far before the trades the window read looks (see
+    load_quote_window); `unit` pins the epoch unit of a numeric ts column (default: epoch_unit_sql).
+    Returns (matched, bid, ask, mode_used). A PhaseTimer records 'quote_load'
+    (mode choice and the quote read/sort) and 'nbbo_match'; the stream, indexed and window modes
+    read quotes while matching, so all of their time is 'nbbo_match'.
+    """
+    timer = timer or PhaseTimer(enabled=False)
+    if cache is not None and mode in ('auto', 'memory', 'window'):
+        with timer.phase('nbbo_match', rows=len(key)):
+            return cache.join(key, ts) + ('cache',)
+    with timer.phase('quote_load'):
+        mode = resolve_nbbo_mode(con, table, cols, len(key), mode, create_index)
+    if mode != 'memory':
+        with timer.phase('nbbo_match', rows=len(key)):
+            if mode == 'indexed':
+                return probe_asof_join(con, table, cols, key, ts, unit) + ('indexed',)
+            if mode == 'stream':
+                return stream_asof_join(con, table, cols, key, ts, chunk, unit) + ('stream',)
+            return window_asof_join(con, table, cols, key, ts, unit, lookback) + ('window',)
+    with timer.phase('quote_load') as ph:
+        index = load_quote_index(con, table, cols)
+        ph['rows'] = len(index)
+    with timer.phase('nbbo_match', rows=len(key)):
+        return index.join(key, ts) + ('memory',)
+
+def nbbo_check(trades, matched, bid, ask, tol):
+    """
+    Band test for as-of joined entries: ([checked, within, mid_or_better], outlier indices in
+    ledger order). Only entries with a price and a quote are checked; outliers fall outside
+    [bid - tol, ask + tol], and mid-or-better needs an uncrossed quote.
+    """
+    px = trades.entry_px
+    checked = matched & trades.has_entry_px
+    within = (px >= bid - tol) & (px <= ask + tol)
+    counts = [int(checked.sum()), int((checked & within).sum()),
+              int((checked & (ask >= bid) & (px >= (bid + ask) / 2.0)).sum())]
+    return counts, np.flatnonzero(checked & ~within)
+
+def nbbo_outlier(trades, i, bid, ask):
+    """Report record for trade i outside the band"""
+    return {'symbol': trades.quote_key[i], 'time': str(trades.entry_raw[i]), 'price': float(trades.entry_px[i]),
+            'bid': float(bid[i]), 'ask': float(ask[i])}
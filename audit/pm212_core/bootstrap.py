@@ -0,0 +1,83 @@
+"""
+Block-bootstrap confidence intervals for profit factor and net P&L.
+Daily P&L (one column per slippage level) is resampled with circular moving blocks, which keeps
+the short-range dependence a day-by-day bootstrap would destroy. Blocks are contiguous, so the
+gains, losses and net of every possible block are precomputed from prefix sums; a chunk of
+resamples is then one matrix of block starts gathered against those tables, O(days / block) per
+resample, and the chunk size bounds memory. Every chunk draws from its own SeedSequence child,
+so results depend only on the seed, never on how chunks are spread over processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+CHUNK_CELLS = 8_000_000  # resamples x blocks x 3 sums x levels per chunk
+
+def block_starts(rng, n_days, block, count):
+    """(count, n_blocks) uniform random block starts; the last block is cut to fill exactly n_days"""
+    return rng.integers(0, n_days, size=(count, -(-n_days // block)))
+
+def _window_sums(x, length):
+    """Circular sums x[s] + ... + x[s + length - 1] for every start s (x: (n_days, n_levels))"""
+    ext = np.concatenate([x, x[:length]]) if length <= len(x) else np.concatenate([x] * (length // len(x) + 2))
+    cs = np.concatenate([np.zeros((1, x.shape[1])), np.cumsum(ext, axis=0)])
+    return cs[length:length + len(x)] - cs[:len(x)]
+
+def block_tables(daily, block):
+    """(full, last): per start, (gains, losses, net) x levels over a full block and over the cut last block"""
+    n_days = len(daily)
+    parts = (np.where(daily > 0, daily, 0.0), -np.where(daily < 0, daily, 0.0), daily)
+    last = n_days - (-(-n_days // block) - 1) * block
+    full = np.stack([_window_sums(x, block) for x in parts], axis=1)  # (n_days, 3, n_levels)
+    tail = np.stack([_window_sums(x, last) for x in parts], axis=1)
+    return full, tail
+
+def _resample_chunk(full, tail, seed, count, block):
+    """(pf, net) for `count` resamples; pf is inf where a resample has no losing day"""
+    rng = np.random.default_rng(seed)
+    starts = block_starts(rng, len(full), block, count)
+    sums = full[starts[:, :-1]].sum(axis=1) + tail[starts[:, -1]]  # (count, 3, n_levels)
+    gains, losses, net = sums[:, 0], sums[:, 1], sums[:, 2]
+    pf = np.where(losses > 1e-9, gains / np.where(losses > 1e-9, losses, 1.0), np.inf)
+    return pf, net
+
+def block_bootstrap(daily, resamples=10000, block=5, seed=212, workers=1, chunk_cells=CHUNK_CELLS):
+    """
+    Resampled profit factor and net P&L. daily: (n_days,) or (n_days, n_levels).
+    Returns (pf, net), each (resamples, n_levels). workers > 1 spreads chunks over processes.
+    """
+    daily = np.asarray(daily, dtype=np.float64)
+    if daily.ndim == 1:
+        daily = daily[:, None]
+    n_days, n_levels = daily.shape
+    if not n_days or resamples <= 0:
+        return np.empty((0, n_levels)), np.empty((0, n_levels))
+    block = max(1, min(int(block), n_days))
+    full, tail = block_tables(daily, block)
+    per_chunk = max(1, chunk_cells // (-(-n_days // block) * 3 * n_levels))
+    counts = [min(per_chunk, resamples - lo) for lo in range(0, resamples, per_chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(counts))
+    tasks = [(full, tail, s, c, block) for s, c in zip(seeds, counts)]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            parts = list(pool.map(_resample_chunk, *zip(*tasks)))
+    else:
+        parts = [_resample_chunk(*t) for t in tasks]
+    return np.concatenate([p for p, _ in parts]), np.concatenate([n for _, n in parts])
+
+def confidence_interval(values, confidence=0.95):
+    """{'lower', 'median', 'upper'} percentile interval; infinite PFs (no losing day) come out as None"""
+    if not len(values):
+        return {'lower': None, 'median': None, 'upper': None}
+    tail = (1.0 - confidence) / 2.0
+    lo, mid, hi = np.quantile(values, [tail, 0.5, 1.0 - tail])
+    r = lambda v: round(float(v), 2) if np.isfinite(v) else None
+    return {'lower': r(lo), 'median': r(mid), 'upper': r(hi)}
+
+def bootstrap_summary(daily, labels, resamples=10000, block=5, confidence=0.95, seed=212, workers=1):
+    """JSON-ready CIs per column of `daily`, keyed by `labels` (e.g. slippage level names)"""
+    pf, net = block_bootstrap(daily, resamples, block, seed, workers)
+    out = {'resamples': int(resamples), 'block_days': int(block), 'confidence': confidence, 'seed': seed, 'levels': {}}
+    for j, label in enumerate(labels):
+        out['levels'][label] = {'profit_factor': confidence_interval(pf[:, j], confidence),
+                                'net_sum': confidence_interval(net[:, j], confidence)}
+    return out
@@ -0,0 +1,60 @@
+"""
+Persisted audit state for incremental runs.
+A checkpoint holds everything the report is built from: the daily aggregate, the guardrail
+loss streak at the open of every day, the NBBO counters and the last audited ledger rowid.
+The next run loads only rows past that rowid, merges them in and re-walks the guardrail from
+the first day they touch. Assumes an append-only ledger; any other edit needs a full run.
+"""
+import json, os
+import numpy as np
+from .aggregate import DailyAggregate
+
+CHECKPOINT_VERSION = 1
+
+def checkpoint_path(report_path):
+    """Default checkpoint location: next to the report, e.g. pm212_audit_report.checkpoint.json"""
+    return os.path.splitext(report_path)[0] + '.checkpoint.json'
+
+def aggregate_state(agg):
+    return {
+        'days': [str(d) for d in agg.days],
+        'daily_net': agg.daily_net.tolist(),
+        'daily_units': agg.daily_units.tolist(),
+        'levels': agg.levels.tolist(),
+        'trade_wins': agg.trade_wins.tolist(),
+        'trade_losses': agg.trade_losses.tolist(),
+        'trade_gross_win': agg.trade_gross_win.tolist(),
+        'trade_gross_loss': agg.trade_gross_loss.tolist(),
+    }
+
+def aggregate_from_state(state):
+    levels = np.asarray(state['levels'], dtype=np.float64)
+    daily_net = np.asarray(state['daily_net'], dtype=np.float64)
+    daily_units = np.asarray(state['daily_units'], dtype=np.float64)
+    return DailyAggregate(
+        np.asarray(state['days'], dtype='datetime64[D]'), daily_net, levels,
+        daily_net[:, None] - daily_units[:, None] * levels[None, :],
+        np.asarray(state['trade_wins'], dtype=np.int64), np.asarray(state['trade_losses'], dtype=np.int64),
+        np.asarray(state['trade_gross_win'], dtype=np.float64), np.asarray(state['trade_gross_loss'], dtype=np.float64),
+        daily_units)
+
+def load_checkpoint(path, fingerprint):
+    """
+    Checkpoint dict from `path`, or None when it is missing, unreadable, from another version or
+    written for a different `fingerprint` (tables, column mapping, audit parameters).
+    """
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('version') != CHECKPOINT_VERSION or state.get('fingerprint') != fingerprint:
+        return None
+    return state
+
+def save_checkpoint(path, state, fingerprint):
+    state = dict(state, version=CHECKPOINT_VERSION, fingerprint=fingerprint)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)  # a crash mid-write leaves the previous checkpoint intact
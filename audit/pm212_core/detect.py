@@ -0,0 +1,81 @@
+"""
+Table and column auto-detection, one rule set for both auditors.
+Tables are matched by regex on the lower-cased name (first pattern wins, in schema order) and
+returned under their real name; columns are picked from the first candidate present, compared
+case-insensitively. The result is the mapping cached by schema.cached_mapping.
+"""
+import re
+from .loader import quote_ident, pragma
+
+TRADE_TABLES = (r'trade', r'fills?', r'positions?')
+QUOTE_TABLES = (r'nbbo', r'quote', r'bestbidask', r'book')
+BAR_TABLES = (r'bar', r'ohlcv', r'prices?', r'underlying')
+
+QUOTE_COLS = {
+    'key': ('symbol', 'underlying', 'ticker', 'contract_id'),
+    'ts':  ('ts', 'timestamp', 'time', 'quote_time'),
+    'bid': ('bid', 'best_bid'),
+    'ask': ('ask', 'best_ask'),
+}
+TRADE_COLS = {
+    'symbol':      ('symbol', 'underlying', 'ticker'),
+    'entry_time':  ('entry_time', 'open_time', 'time_in', 'ts_in', 'timestamp_in', 'timestamp'),
+    'exit_time':   ('exit_time', 'close_time', 'time_out', 'ts_out'),
+    'entry_price': ('entry_price', 'open_price', 'fill_price', 'price_in', 'avg_entry', 'price'),
+    'exit_price':  ('exit_price', 'close_price', 'price_out', 'avg_exit'),
+    'qty':         ('qty', 'quantity', 'contracts', 'size'),
+    'fees':        ('fees', 'commission', 'commissions', 'total_fees'),
+    'multiplier':  ('multiplier', 'contract_multiplier'),
+    'realized':    ('realized_pnl', 'realized', 'pnl', 'profit'),
+}
+
+def detect_table(con, patterns, schema=None):
+    """
+    First table whose lower-cased name matches a pattern (patterns in priority order), or None.
+    Tables of an attached `schema` are returned qualified ('quotes_db.nbbo_quotes').
+    """
+    prefix = f"{quote_ident(schema)}." if schema else ''
+    names = [r[0] for r in con.execute(f"SELECT name FROM {prefix}sqlite_schema WHERE type='table'").fetchall()]
+    for pat in patterns:
+        for n in names:
+            if re.search(pat, n.lower()):
+                return f"{schema}.{n}" if schema else n
+    return None
+
+def table_columns(con, table):
+    return [r[1] for r in con.execute(pragma('table_info', table)).fetchall()]
+
+def pick(cols, candidates):
+    """First candidate present in `cols` (case-insensitive), under its real name"""
+    low = {c.lower(): c for c in cols}
+    for c in candidates:
+        if c and c.lower() in low:
+            return low[c.lower()]
+    return None
+
+def map_columns(mapping, tcols=None, qcols=None):
+    """Fill mapping's trade_cols/quote_cols from the column names of its trades and quotes tables (None: no table)"""
+    mapping['quote_cols'], mapping['trade_cols'] = {}, {}
+    c_q_key = None
+    if qcols is not None:
+        # Mapped on their own too: a quotes-only database can be the shared source of `compare`
+        mapping['quote_cols'] = {k: pick(qcols, cands) for k, cands in QUOTE_COLS.items()}
+        c_q_key = mapping['quote_cols']['key']
+    if tcols is not None:
+        mapping['trade_cols'] = {k: pick(tcols, cands) for k, cands in TRADE_COLS.items()}
+        # Trades carrying the quote key column (e.g. contract_id for nbbo_quotes) join on it, else on symbol
+        mapping['trade_cols']['quote_key'] = pick(tcols, [c_q_key])
+    return mapping
+
+def detect_mapping(con, quotes_schema=None):
+    """
+    Auto-detected tables and the logical -> physical column mapping the auditors read.
+    With quotes_schema (see loader.attach_quotes) the quotes table is looked up in that attached
+    database only.
+    """
+    trades_tbl = detect_table(con, TRADE_TABLES)
+    quotes_tbl = detect_table(con, QUOTE_TABLES, quotes_schema)
+    mapping = {'trades_table': trades_tbl, 'quotes_table': quotes_tbl, 'bars_table': detect_table(con, BAR_TABLES),
+               'trade_cols': {}, 'quote_cols': {}}
+    return map_columns(mapping, table_columns(con, trades_tbl) if trades_tbl else None,
+                       table_columns(con, quotes_tbl) if quotes_tbl else None)
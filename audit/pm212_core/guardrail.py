@@ -0,0 +1,79 @@
+"""
+Reverse-Fibonacci daily loss guardrail over a growing daily P&L series.
+The one-shot auditors walk the finished series (guardrail_walk); GuardrailTracker keeps the
+walk's state so fills can be added as they arrive. A fill for the latest day costs O(1); a late
+fill for an earlier day re-walks from that day. Both apply the same limits and tolerance.
+"""
+from bisect import bisect_left
+
+START_LOSS = 500.0
+FIB = (300.0, 200.0, 100.0)
+EPS = 1e-6  # above float noise from summing a day in a different order (shards, checkpoints)
+
+def guardrail_walk(daily, loss_streak=0, fib=FIB, eps=EPS):
+    """
+    Walk [(day, net_pnl)] in day order from `loss_streak` red days. Returns (breaches, streak at
+    each day's open, streak after the last day); a breach is (day, net, allowed, streak_at_open).
+    """
+    breaches, streak_open = [], []
+    for day, pnl in daily:
+        streak_open.append(loss_streak)
+        if pnl >= 0:
+            loss_streak = 0
+            continue
+        allowed = fib[min(loss_streak, len(fib) - 1)]
+        if -pnl > allowed + eps:
+            breaches.append((day, pnl, allowed, loss_streak))
+        loss_streak = min(len(fib), loss_streak + 1)
+    return breaches, streak_open, loss_streak
+
+class GuardrailTracker:
+    """Per-day net P&L with the loss streak at each day's open and the days in breach"""
+
+    def __init__(self, start_loss=START_LOSS, fib=FIB, eps=EPS):
+        self.start_loss = start_loss
+        self.fib = tuple(fib)
+        self.eps = eps
+        self.days = []         # sorted
+        self.pnl = []          # net P&L per day
+        self.streak_open = []  # consecutive red days before each day
+        self.breached = []     # bool per day
+
+    def allowed(self, pnl, streak):
+        return self.start_loss if pnl >= 0 else self.fib[min(streak, len(self.fib) - 1)]
+
+    def _after(self, i):
+        """Loss streak after day i closes"""
+        return 0 if self.pnl[i] >= 0 else min(len(self.fib), self.streak_open[i] + 1)
+
+    @property
+    def loss_streak(self):
+        return self._after(len(self.days) - 1) if self.days else 0
+
+    def add(self, day, pnl):
+        """
+        Add `pnl` to `day`. Returns [(day, net, allowed, streak_at_open)] for days that are in
+        breach now and were not before (the touched day, or later days after a late fill).
+        """
+        i = bisect_left(self.days, day)
+        if i == len(self.days) or self.days[i] != day:
+            self.days.insert(i, day)
+            self.pnl.insert(i, 0.0)
+            self.streak_open.insert(i, 0)
+            self.breached.insert(i, False)
+        self.pnl[i] += pnl
+
+        new = []
+        streak = self._after(i - 1) if i else 0
+        for j in range(i, len(self.days)):
+            if j > i and streak == self.streak_open[j]:
+                break  # the rest of the walk is unchanged
+            self.streak_open[j] = streak
+            p = self.pnl[j]
+            allowed = self.allowed(p, streak)
+            breach = p < 0 and abs(p) > allowed + self.eps
+            if breach and not self.breached[j]:
+                new.append((self.days[j], p, allowed, streak))
+            self.breached[j] = breach
+            streak = self._after(j)
+        return new
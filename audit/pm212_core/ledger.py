@@ -0,0 +1,91 @@
+"""
+One load of a trades table, shared by every report built over it.
+Ledger reads the trades once (columnar, see loader) and memoizes what the auditors derive from
+them: the fused daily aggregate per set of slippage levels and the as-of NBBO quote at every
+entry. pm212_audit.py and the pre-paper agent both audit a Ledger, so running the two in one
+process (pm212_prepaper_agent.py --audit-out) reads and joins each table once.
+"""
+from .loader import fetch_trades, trades_from_columns
+from .aggregate import aggregate_daily
+from .asof import nbbo_join, resolve_nbbo_mode, epoch_unit_sql, STREAM_CHUNK
+from .shard import range_where
+from .perf import PhaseTimer
+
+class Ledger:
+    """
+    Trades of mapping['trades_table'] (optionally filtered by `where`), loaded on first use.
+    `fetch` replaces the SQL read for other sources: a callable returning the raw columns in the
+    loader.fetch_trades layout (e.g. parquet.fetch_parquet_trades).
+    `span` = (lo, hi) epoch µs (None for an open end) keeps the trades entered in [lo, hi): the
+    window goes into the SELECT's WHERE (shard.range_where) and is applied exactly after parsing.
+    Quotes are then read for the trades' own time span (window mode) plus `lookback` µs before it;
+    entries with no quote in that read are looked up further back (see asof.window_asof_join).
+    """
+
+    def __init__(self, con, mapping, where=None, params=(), timer=None, fetch=None, span=None, lookback=None):
+        self.con = con
+        self.mapping = mapping
+        self.where, self.params = where, params
+        self.fetch = fetch
+        # A window needs entry times to apply to
+        self.span = span if span and any(v is not None for v in span) and mapping['trade_cols'].get('entry_time') else None
+        self.lookback = lookback
+        self.timer = timer or PhaseTimer(enabled=False)
+        self._trades = None
+        self._aggregates = {}
+        self._entry_quotes = None
+        self._quote_unit = None
+
+    @property
+    def trades(self):
+        if self._trades is None:
+            with self.timer.phase('fetch_trades') as ph:
+                if self.fetch:
+                    raw = self.fetch()
+                else:
+                    where, params = self.where, list(self.params)
+                    if self.span:
+                        table, cols = self.mapping['trades_table'], self.mapping['trade_cols']
+                        span_where, span_params = range_where(self.con, table, cols['entry_time'], *self.span)
+                        if span_where:
+                            where = f"({where}) AND {span_where}" if where else span_where
+                            params += span_params
+                    raw = fetch_trades(self.con, self.mapping['trades_table'], self.mapping['trade_cols'], where, params)
+                ph['rows'] = len(raw[0])
+            with self.timer.phase('parse', rows=len(raw[0])):
+                trades = trades_from_columns(raw)
+                if self.span:
+                    keep = trades.in_span(*self.span)
+                    trades = trades if keep.all() else trades.take(keep)
+                self._trades = trades
+        return self._trades
+
+    def aggregate(self, levels):
+        """DailyAggregate for these slippage levels ($ per contract), computed once per set of levels"""
+        key = tuple(float(x) for x in levels)
+        if key not in self._aggregates:
+            with self.timer.phase('daily_agg', rows=len(self.trades)):
+                self._aggregates[key] = aggregate_daily(self.trades, list(key))
+        return self._aggregates[key]
+
+    def join(self, key, ts, mode='auto', chunk=STREAM_CHUNK, create_index=False, cache=None):
+        """(matched, bid, ask) as-of joined against the quotes table (see asof.nbbo_join)"""
+        table, cols = self.mapping['quotes_table'], self.mapping['quote_cols']
+        if self.span and cache is None and mode in ('auto', 'memory'):
+            # A date window reads the quotes of its own span, not the whole table
+            mode = resolve_nbbo_mode(self.con, table, cols, len(key), mode, create_index)
+            mode = 'window' if mode == 'memory' else mode
+        if self._quote_unit is None and cache is None and mode != 'memory':
+            self._quote_unit = epoch_unit_sql(self.con, table, cols['ts'])  # once per ledger, not per join
+        return nbbo_join(self.con, table, cols, key, ts, mode, chunk, create_index, cache, self.timer,
+                         self.lookback if self.span else None, self._quote_unit)[:3]
+
+    def entry_quotes(self, mode='auto', chunk=STREAM_CHUNK, create_index=False, cache=None):
+        """
+        (matched, bid, ask) at every trade's entry time. Every mode gives the same join, so the
+        first caller's mode reads the quotes and later callers reuse the result.
+        """
+        if self._entry_quotes is None:
+            trades = self.trades
+            self._entry_quotes = self.join(trades.quote_key, trades.entry_ts, mode, chunk, create_index, cache)
+        return self._entry_quotes
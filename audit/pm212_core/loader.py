@@ -0,0 +1,192 @@
+"""
+Columnar trade loading.
+Column mapping and COALESCE/CAST coercion are pushed into the SELECT, rows are fetched
+as plain tuples in chunks and transposed straight into NumPy arrays.
+"""
+import os, sqlite3
+import numpy as np
+from .timeparse import parse_timestamps, NAT_US
+
+FETCH_CHUNK = 65536
+
+QUOTES_SCHEMA = 'quotes_db'  # schema name of a separate quotes database (--quotes-db)
+
+def quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def split_table(name):
+    """(schema, table) for 'quotes_db.<table>' (a table of the attached quotes database), else (None, name)"""
+    schema, dot, table = str(name).partition('.')
+    return (schema, table) if dot and schema == QUOTES_SCHEMA else (None, str(name))
+
+def attached_table(name):
+    """`name` as a table of the attached quotes database (a --mapping override may name it bare)"""
+    return name if not name or split_table(name)[0] else f"{QUOTES_SCHEMA}.{name}"
+
+def quote_table(name):
+    """Quoted table reference, schema-qualified for tables of the attached quotes database"""
+    schema, table = split_table(name)
+    return f"{quote_ident(schema)}.{quote_ident(table)}" if schema else quote_ident(table)
+
+def pragma(name, table):
+    """PRAGMA <name>(<table>) in the schema the table lives in"""
+    schema, table = split_table(table)
+    return f"PRAGMA {quote_ident(schema) + '.' if schema else ''}{name}({quote_ident(table)})"
+
+def attach_quotes(con, path):
+    """
+    ATTACH a separate quotes database as QUOTES_SCHEMA, so SQL against its tables (as-of probes,
+    quote windows) runs inside SQLite next to the ledger instead of in a copy of the quotes.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"quotes database {path} not found")
+    con.execute(f"ATTACH DATABASE ? AS {quote_ident(QUOTES_SCHEMA)}", (os.path.abspath(path),))
+
+def _real(col, default, zero_is_null=False):
+    if not col:
+        return 'NULL' if default is None else repr(float(default))
+    expr = f"CAST({quote_ident(col)} AS REAL)"
+    if zero_is_null:
+        expr = f"NULLIF({expr}, 0)"
+    return expr if default is None else f"COALESCE({expr}, {float(default)!r})"
+
+def _raw(col):
+    return quote_ident(col) if col else 'NULL'
+
+def has_rowid(con, table):
+    try:
+        con.execute(f"SELECT rowid FROM {quote_table(table)} LIMIT 0")
+        return True
+    except sqlite3.OperationalError:  # WITHOUT ROWID table
+        return False
+
+def trade_select_sql(table, cols, where=None, rowid=True):
+    """
+    SELECT for the trades table. `cols` maps logical names (symbol, entry_time, exit_time,
+    entry_price, exit_price, qty, fees, multiplier, realized, quote_key) to physical columns or None.
+    quote_key is the column matched against the quotes table key (defaults to symbol).
+    Defaults mirror the auditors: missing prices/qty/fees -> 0, multiplier -> 100, realized stays NULL.
+    With `rowid` the rows come back in rowid order with the rowid as the last column, so any subset
+    selected by `where` keeps the relative order of a full load.
+    """
+    exprs = [
+        f"{_raw(cols.get('symbol'))} AS symbol",
+        f"{_raw(cols.get('entry_time'))} AS entry_time",
+        f"{_raw(cols.get('exit_time'))} AS exit_time",
+        f"{_real(cols.get('entry_price'), 0)} AS entry_px",
+        f"{quote_ident(cols['entry_price']) + ' IS NOT NULL' if cols.get('entry_price') else '0'} AS has_entry_px",
+        f"{_real(cols.get('exit_price'), 0)} AS exit_px",
+        f"{_real(cols.get('qty'), 0)} AS qty",
+        f"{_real(cols.get('fees'), 0)} AS fees",
+        f"{_real(cols.get('multiplier'), 100, zero_is_null=True)} AS mult",
+        f"{_real(cols.get('realized'), None)} AS realized",
+        f"{_raw(cols.get('quote_key') or cols.get('symbol'))} AS quote_key",
+        f"{'rowid' if rowid else 'NULL'} AS row_id",
+    ]
+    sql = f"SELECT {', '.join(exprs)} FROM {quote_ident(table)}"
+    if where:
+        sql += f" WHERE {where}"
+    return sql + (" ORDER BY rowid" if rowid else "")
+
+def fetch_columns(con, sql, params=(), chunk=FETCH_CHUNK):
+    """Run `sql` and return its result as a list of object arrays, one per column"""
+    cur = con.cursor()
+    cur.row_factory = None
+    cur.execute(sql, params)
+    ncols = len(cur.description)
+    parts = [[] for _ in range(ncols)]
+    while True:
+        rows = cur.fetchmany(chunk)
+        if not rows:
+            break
+        for i, col in enumerate(zip(*rows)):
+            parts[i].append(np.array(col, dtype=object))
+    return [np.concatenate(p) if p else np.empty(0, dtype=object) for p in parts]
+
+class TradeColumns:
+    """Trades as parallel NumPy arrays (one element per trade)"""
+
+    def __init__(self, symbol, entry_raw, entry_ts, exit_ts, entry_px, has_entry_px, exit_px, qty, fees, mult, realized,
+                 quote_key=None, row_id=None):
+        self.symbol = symbol        # object
+        self.entry_raw = entry_raw  # object, timestamps as stored
+        self.entry_ts = entry_ts    # datetime64[us], NaT if unparseable
+        self.exit_ts = exit_ts
+        self.entry_px = entry_px    # float64
+        self.has_entry_px = has_entry_px  # bool, False where the ledger price was NULL (entry_px is 0 there)
+        self.exit_px = exit_px
+        self.qty = qty
+        self.fees = fees
+        self.mult = mult
+        self.realized = realized    # float64, NaN where the ledger has no realized P&L
+        self.quote_key = symbol if quote_key is None else quote_key  # key into the quotes table
+        self.row_id = row_id        # int64 ledger rowid, or None for WITHOUT ROWID tables
+
+    def __len__(self):
+        return len(self.entry_px)
+
+    def take(self, idx):
+        """The trades at `idx` (indices or a boolean mask), in that order"""
+        return TradeColumns(**{k: None if v is None else v[idx] for k, v in vars(self).items()})
+
+    def in_span(self, lo=None, hi=None):
+        """Mask of trades entered in [lo, hi) (epoch µs, None for an open end); NaT entries are outside any window"""
+        ts = self.entry_ts.astype(np.int64)
+        return (ts != NAT_US) & (lo is None or ts >= lo) & (hi is None or ts < hi)
+
+    def gross_pnl(self):
+        """Realized P&L, falling back to (exit - entry) * qty * multiplier where it is missing"""
+        computed = (self.exit_px - self.entry_px) * self.qty * self.mult
+        return np.where(np.isnan(self.realized), computed, self.realized)
+
+    def net_pnl(self):
+        return self.gross_pnl() - self.fees
+
+    def entry_day(self):
+        return self.entry_ts.astype('datetime64[D]')
+
+    def to_arrow(self):
+        import pyarrow as pa
+        return pa.table({
+            'symbol': pa.array(self.symbol.tolist()),
+            'entry_time': pa.array(self.entry_ts),
+            'exit_time': pa.array(self.exit_ts),
+            'entry_price': self.entry_px,
+            'exit_price': self.exit_px,
+            'qty': self.qty,
+            'fees': self.fees,
+            'multiplier': self.mult,
+            'realized': pa.array(self.realized, from_pandas=True),
+        })
+
+def fetch_trades(con, table, cols, where=None, params=()):
+    """Raw trade columns (object arrays, timestamps as stored) from one SELECT; the last element is the rowid flag"""
+    rowid = has_rowid(con, table)
+    return fetch_columns(con, trade_select_sql(table, cols, where, rowid), params) + [rowid]
+
+def trades_from_columns(raw):
+    """TradeColumns from fetch_trades output: one parse pass per timestamp column, numeric columns to float64"""
+    symbol, entry_raw, exit_raw, entry_px, has_entry_px, exit_px, qty, fees, mult, realized, quote_key, row_id, rowid = raw
+    as_f64 = lambda a: a.astype(np.float64)
+    return TradeColumns(
+        symbol=symbol,
+        entry_raw=entry_raw,
+        entry_ts=parse_timestamps(entry_raw),
+        exit_ts=parse_timestamps(exit_raw),
+        entry_px=as_f64(entry_px),
+        has_entry_px=has_entry_px.astype(bool),
+        exit_px=as_f64(exit_px),
+        qty=as_f64(qty),
+        fees=as_f64(fees),
+        mult=as_f64(mult),
+        realized=as_f64(realized),
+        quote_key=quote_key,
+        row_id=row_id.astype(np.int64) if rowid else None,
+    )
+
+def load_trades(con, table, cols, where=None, params=()):
+    """
+    Load the trades table into TradeColumns with one SELECT and one parse pass per timestamp column.
+    `where` is an optional SQL filter over physical columns, bound with `params`.
+    """
+    return trades_from_columns(fetch_trades(con, table, cols, where, params))
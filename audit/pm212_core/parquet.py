@@ -0,0 +1,179 @@
+"""
+Parquet/Arrow datasets as an audit source next to SQLite (archived ledgers, NBBO history).
+A path (one file or a directory of files, hive partitions allowed) stands in for a table. Only
+the mapped columns are read, and the --start/--end window is pushed into the scan as a filter on
+the entry time (trades) or ts (quotes) column, so row groups outside it are skipped from their
+statistics. Pushdown needs a column Arrow can compare in time order: timestamp, date or numeric
+epochs (s, ms and µs each occupy their own magnitude band, matching the per-value unit rule of
+timeparse). Text timestamps are filtered after parsing instead.
+"""
+import os
+import numpy as np
+from .detect import map_columns, table_columns
+from .timeparse import to_epoch_us, NAT_US
+from .asof import QuoteIndex
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = pc = ds = None
+
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+_EPOCH_SCALE = {'s': 1_000_000, 'ms': 1_000, 'us': 1}
+# Epoch bands the per-value unit rule assigns (see timeparse): seconds, milliseconds, microseconds
+_EPOCH_BANDS = (('s', None, 1e11), ('ms', 1e11, 1e14), ('us', 1e14, None))
+
+def is_parquet(path):
+    """True for a .parquet file or a directory holding .parquet files"""
+    if os.path.isdir(path):
+        return any(f.endswith(PARQUET_SUFFIXES) for _, _, files in os.walk(path) for f in files)
+    return str(path).endswith(PARQUET_SUFFIXES)
+
+def dataset(path):
+    if ds is None:
+        raise ImportError('Parquet sources need pyarrow installed (pip install pyarrow).')
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Parquet source {path} not found")
+    return ds.dataset(path, format='parquet', partitioning='hive')
+
+def parquet_columns(path):
+    return list(dataset(path).schema.names)
+
+def parquet_mapping(con, mapping, trades_path=None, quotes_path=None):
+    """
+    `mapping` (detected on `con`) with its trades and/or quotes table replaced by a Parquet
+    dataset: the path is the table name and columns are picked from the dataset schema by the
+    detect_mapping rules. A Parquet ledger has no bars table.
+    """
+    mapping = dict(mapping)
+    if trades_path:
+        mapping.update(trades_table=trades_path, bars_table=None)
+    if quotes_path:
+        mapping['quotes_table'] = quotes_path
+    tcols = parquet_columns(trades_path) if trades_path else \
+        table_columns(con, mapping['trades_table']) if mapping['trades_table'] else None
+    qcols = parquet_columns(quotes_path) if quotes_path else \
+        table_columns(con, mapping['quotes_table']) if mapping['quotes_table'] else None
+    return map_columns(mapping, tcols, qcols)
+
+def _range(col, lo, hi, scalar):
+    expr = None
+    for e in (None if lo is None else col >= scalar(lo), None if hi is None else col < scalar(hi)):
+        if e is not None:
+            expr = e if expr is None else expr & e
+    return expr
+
+def time_filter(field, lo, hi):
+    """
+    Dataset filter keeping `field` in [lo, hi) (epoch µs, None for an open end), or None when its
+    type cannot be compared in time order without parsing.
+    """
+    col, t = ds.field(field.name), field.type
+    if lo is None and hi is None:
+        return None
+    if pa.types.is_timestamp(t):
+        return _range(col, lo, hi, lambda v: pa.scalar(v, type=pa.timestamp('us', tz=t.tz)).cast(t))
+    if pa.types.is_date(t):
+        return _range(col, lo, hi, lambda v: pa.scalar(np.datetime64(v, 'us').astype('datetime64[D]').item(), type=t))
+    if not (pa.types.is_integer(t) or pa.types.is_floating(t)):
+        return None
+    # One range per epoch unit, clipped to the magnitudes that unit is read from
+    num = float if pa.types.is_floating(t) else (lambda v: int(np.ceil(v)))
+    expr = None
+    for unit, floor, ceil in _EPOCH_BANDS:
+        scale = _EPOCH_SCALE[unit]
+        lows = [x for x in (floor, None if lo is None else lo / scale) if x is not None]
+        highs = [x for x in (ceil, None if hi is None else hi / scale) if x is not None]
+        band = _range(col, max(lows) if lows else None, min(highs) if highs else None, num)
+        expr = band if expr is None else expr | band
+    return expr
+
+def _scan(path, columns, time_col, lo, hi):
+    """(table of `columns`, filtered) and whether the time window still has to be applied after parsing"""
+    data = dataset(path)
+    field = data.schema.field(time_col) if time_col else None
+    filt = time_filter(field, lo, hi) if field is not None else None
+    table = data.to_table(columns=sorted(set(columns)), filter=filt)
+    return table, filt is None and field is not None and (lo is not None or hi is not None)
+
+def _values(table, col):
+    """Column as a NumPy array (object for text, categories decoded)"""
+    arr = table.column(col)
+    if pa.types.is_dictionary(arr.type):
+        arr = arr.cast(arr.type.value_type)
+    if arr.null_count and pa.types.is_integer(arr.type):
+        return np.array(arr.to_pylist(), dtype=object)  # to_numpy would turn the ints into floats around NaN
+    return arr.to_numpy(zero_copy_only=False)
+
+def _times(table, col):
+    """Timestamps as stored for the parser: timestamp/date columns as ISO text (UTC), others as is"""
+    arr = table.column(col)
+    if pa.types.is_timestamp(arr.type) or pa.types.is_date(arr.type):
+        if pa.types.is_timestamp(arr.type) and arr.type.tz is not None:
+            arr = arr.cast(pa.timestamp(arr.type.unit))  # UTC wall time
+        arr = arr.cast(pa.string())
+    return np.asarray(_values(pa.table({'t': arr}), 't'), dtype=object)
+
+def _real(table, col, default, zero_is_null=False):
+    """float64 column with the SQL path's defaults (missing column or NULL -> default, NaN when None)"""
+    n = table.num_rows
+    if not col:
+        return np.full(n, np.nan if default is None else float(default))
+    x = pc.cast(table.column(col), pa.float64()).to_numpy(zero_copy_only=False).astype(np.float64)
+    if zero_is_null:
+        x[x == 0] = np.nan
+    if default is not None:
+        x[np.isnan(x)] = float(default)
+    return x
+
+def _keep(raw, keep):
+    return [c[keep] if isinstance(c, np.ndarray) else c for c in raw]
+
+def fetch_parquet_trades(path, cols, lo=None, hi=None):
+    """
+    Raw trade columns in the loader.fetch_trades layout from a Parquet ledger, entry times in
+    [lo, hi) epoch µs. Rows keep dataset order; there is no rowid.
+    """
+    wanted = [c for c in cols.values() if c]
+    table, late = _scan(path, wanted, cols.get('entry_time'), lo, hi)
+    n = table.num_rows
+    none = np.full(n, None, dtype=object)
+    symbol = _values(table, cols['symbol']).astype(object) if cols.get('symbol') else none
+    key_col = cols.get('quote_key') or cols.get('symbol')
+    entry = _times(table, cols['entry_time']) if cols.get('entry_time') else none
+    raw = [
+        symbol,
+        entry,
+        _times(table, cols['exit_time']) if cols.get('exit_time') else none,
+        _real(table, cols.get('entry_price'), 0),
+        pc.is_valid(table.column(cols['entry_price'])).to_numpy(zero_copy_only=False) if cols.get('entry_price')
+        else np.zeros(n, dtype=bool),
+        _real(table, cols.get('exit_price'), 0),
+        _real(table, cols.get('qty'), 0),
+        _real(table, cols.get('fees'), 0),
+        _real(table, cols.get('multiplier'), 100, zero_is_null=True),
+        _real(table, cols.get('realized'), None),
+        _values(table, key_col).astype(object) if key_col else none,
+        none,
+        False,
+    ]
+    if late:
+        us = to_epoch_us(entry)
+        raw = _keep(raw, (us != NAT_US) & (lo is None or us >= lo) & (hi is None or us < hi))
+    return raw
+
+def load_parquet_quotes(path, cols, lo=None, hi=None):
+    """QuoteIndex over the Parquet quotes with ts in [lo, hi) epoch µs (None: unbounded)"""
+    table, late = _scan(path, [cols['key'], cols['ts'], cols['bid'], cols['ask']], cols['ts'], lo, hi)
+    ts_col = table.column(cols['ts'])
+    if pa.types.is_timestamp(ts_col.type) or pa.types.is_date(ts_col.type):
+        ts = pc.cast(ts_col, pa.timestamp('us')).cast(pa.int64()).fill_null(NAT_US).to_numpy()
+    else:
+        ts = to_epoch_us(np.asarray(_values(table, cols['ts']), dtype=object))
+    key = np.asarray(_values(table, cols['key']), dtype=object)
+    bid, ask = _real(table, cols['bid'], 0), _real(table, cols['ask'], 0)
+    if late:
+        keep = (ts != NAT_US) & (lo is None or ts >= lo) & (hi is None or ts < hi)
+        key, ts, bid, ask = key[keep], ts[keep], bid[keep], ask[keep]
+    return QuoteIndex.build(key, ts, bid, ask)
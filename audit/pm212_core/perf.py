@@ -0,0 +1,95 @@
+"""
+Per-phase wall time, row counts and memory for the auditors and the benchmark harness.
+PhaseTimer.phase() is a context manager around one stage of an audit; repeated phases (e.g. one
+per shard) accumulate. Memory is the process RSS before/after (Linux /proc, else unavailable)
+and the peak RSS so far (getrusage); neither needs extra packages.
+"""
+import os, sys, time
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows
+
+MB = 1024 * 1024
+
+def rss_bytes():
+    """Current resident set size, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def peak_rss_bytes(children=False):
+    """Peak resident set size of this process so far (children: of its largest finished child), or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, KiB on Linux
+
+def _mb(x):
+    return None if x is None else round(x / MB, 1)
+
+class PhaseTimer:
+    """Ordered {phase: stats}; with enabled=False phases run unmeasured and report() is None"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.phases = {}
+        self.started = time.perf_counter()
+        self.merged = False  # phases from worker processes were folded in
+
+    @contextmanager
+    def phase(self, name, rows=None):
+        """Time the block; set rec['rows'] inside it when the count is only known afterwards"""
+        rec = {'rows': rows}
+        if not self.enabled:
+            yield rec
+            return
+        rss0, t0 = rss_bytes(), time.perf_counter()
+        try:
+            yield rec
+        finally:
+            seconds = time.perf_counter() - t0
+            rss1 = rss_bytes()
+            p = self.phases.setdefault(name, {'seconds': 0.0, 'rows': None, 'rss_delta_bytes': None, 'calls': 0})
+            p['seconds'] += seconds
+            p['calls'] += 1
+            if rec['rows'] is not None:
+                p['rows'] = (p['rows'] or 0) + int(rec['rows'])
+            if rss0 is not None and rss1 is not None:
+                p['rss_delta_bytes'] = (p['rss_delta_bytes'] or 0) + rss1 - rss0
+            p['peak_rss_bytes'] = peak_rss_bytes()
+
+    def merge(self, phases):
+        """Fold the raw phases of a timer in another process (its .phases) into this one; seconds add up across workers"""
+        self.merged = True
+        for name, q in (phases or {}).items():
+            p = self.phases.setdefault(name, {'seconds': 0.0, 'rows': None, 'rss_delta_bytes': None, 'calls': 0})
+            p['seconds'] += q['seconds']
+            p['calls'] += q['calls']
+            for k in ('rows', 'rss_delta_bytes'):
+                if q[k] is not None:
+                    p[k] = (p[k] or 0) + q[k]
+            p['peak_rss_bytes'] = max(p.get('peak_rss_bytes') or 0, q.get('peak_rss_bytes') or 0) or None
+
+    def report(self):
+        """JSON-ready per-phase seconds, rows, rows/sec and MB, plus the total wall time and peak RSS"""
+        if not self.enabled:
+            return None
+        phases = {}
+        for name, p in self.phases.items():
+            phases[name] = {
+                'seconds': round(p['seconds'], 4),
+                'rows': p['rows'],
+                'rows_per_sec': round(p['rows'] / p['seconds']) if p['rows'] is not None and p['seconds'] > 0 else None,
+                'rss_delta_mb': _mb(p['rss_delta_bytes']),
+                'peak_rss_mb': _mb(p.get('peak_rss_bytes')),
+                'calls': p['calls'],
+            }
+        out = {'total_seconds': round(time.perf_counter() - self.started, 4), 'peak_rss_mb': _mb(peak_rss_bytes()),
+               'phases': phases}
+        if self.merged:
+            out['workers_peak_rss_mb'] = _mb(peak_rss_bytes(children=True))
+        return out
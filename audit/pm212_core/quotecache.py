@@ -0,0 +1,80 @@
+"""
+On-disk quote cache.
+The sorted QuoteIndex (unique keys, per-key offsets, int64 µs timestamps, bid, ask) is written once
+per database as plain .npy files and memory-mapped by later audits: opening it costs a few page
+faults instead of fetching and sorting every quote row, and worker processes share the pages.
+meta.json stamps the cache with the quotes table, its column mapping and the size/mtime of the
+database file and its WAL; a cache whose stamp no longer matches is ignored.
+"""
+import json, os
+import numpy as np
+from .asof import QuoteIndex, load_quote_index
+
+CACHE_VERSION = 1
+ARRAYS = ('keys', 'offsets', 'ts', 'bid', 'ask')
+
+def default_cache_dir(db_path):
+    return os.path.abspath(db_path) + '.quotecache'
+
+def db_stamp(db_path):
+    """Size and mtime of the database file and of its -wal file (uncheckpointed writes live there)"""
+    stamp = {}
+    for suffix in ('', '-wal'):
+        try:
+            st = os.stat(db_path + suffix)
+        except OSError:
+            continue
+        stamp['db' + suffix] = [st.st_size, st.st_mtime_ns]
+    return stamp
+
+def _meta(db_path, table, cols):
+    return {'version': CACHE_VERSION, 'db': os.path.abspath(db_path), 'stamp': db_stamp(db_path),
+            'table': table, 'cols': {k: cols[k] for k in ('key', 'ts', 'bid', 'ask')}}
+
+def build_quote_cache(con, db_path, table, cols, cache_dir=None):
+    """
+    Load, sort and write the quotes of `table` under `cache_dir` (default: <db>.quotecache).
+    Returns the cache directory. Keys must be all integers or all strings to be memory-mappable.
+    """
+    cache_dir = cache_dir or default_cache_dir(db_path)
+    meta = _meta(db_path, table, cols)  # stamped before the read: a write during the build makes it stale
+    index = load_quote_index(con, table, cols)
+    if index.keys.dtype == object:
+        raise ValueError(f"{table}.{cols['key']} mixes key types; only all-integer or all-text keys can be cached")
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # arrays are replaced one by one; meta.json goes last and marks the cache complete
+    for name in ARRAYS:
+        path = os.path.join(cache_dir, name + '.npy')
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, getattr(index, name))
+        os.replace(path + '.tmp', path)
+    meta['rows'] = len(index)
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + '.tmp', meta_path)
+    return cache_dir
+
+def read_cache_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def cache_status(db_path, table, cols, cache_dir=None):
+    """'fresh', 'missing' or 'stale' (written for another table/mapping, or the database changed since)"""
+    meta = read_cache_meta(cache_dir or default_cache_dir(db_path))
+    if meta is None or meta.get('version') != CACHE_VERSION:
+        return 'missing'
+    expected = _meta(db_path, table, cols)
+    return 'fresh' if all(meta.get(k) == expected[k] for k in ('db', 'stamp', 'table', 'cols')) else 'stale'
+
+def open_quote_cache(db_path, table, cols, cache_dir=None):
+    """Memory-mapped QuoteIndex from a fresh cache, or None"""
+    cache_dir = cache_dir or default_cache_dir(db_path)
+    if cache_status(db_path, table, cols, cache_dir) != 'fresh':
+        return None
+    arrays = [np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode='r') for name in ARRAYS]
+    return QuoteIndex(*arrays)
@@ -0,0 +1,157 @@
+"""
+Rolling-window metrics over a daily P&L series.
+RollingWindow is updated one day at a time in O(1) amortized: P&L, gains, losses and squares
+are running sums over a fixed-length buffer, the window's equity high and the longest losing
+streak come from monotonic deques. Feeding n days costs O(n) whatever the window length, and
+the same object can follow a live ledger day by day.
+"""
+import math
+from collections import deque
+
+TRADING_DAYS = 252
+DEFAULT_WINDOWS = (20, 60, 250)
+
+class RollingWindow:
+    """Metrics over the last `window` days; push() one day's net P&L at a time"""
+
+    def __init__(self, window, annualization=TRADING_DAYS):
+        self.window = window
+        self.scale = math.sqrt(annualization)
+        self.n = 0                  # days pushed so far
+        self.values = deque()       # last `window` daily P&L values
+        self.net = 0.0
+        self.sq = 0.0
+        self.gross_win = 0.0
+        self.gross_loss = 0.0
+        self.wins = 0               # green / red days in the window
+        self.losses = 0
+        self.equity = 0.0           # cumulative P&L since the first day
+        self.highs = deque()        # (day index, equity), equity decreasing: front is the window high
+        self.runs = deque()         # (day index, red-day run length), length decreasing
+        self.run = 0
+
+    def push(self, pnl):
+        """Add the next day. Returns the window's metrics once `window` days have been seen, else None."""
+        i = self.n
+        self.n += 1
+        self.values.append(pnl)
+        self._add(pnl, 1.0)
+        if len(self.values) > self.window:
+            self._add(self.values.popleft(), -1.0)
+        start = i - self.window + 1
+
+        self.equity += pnl
+        while self.highs and self.highs[-1][1] <= self.equity:
+            self.highs.pop()
+        self.highs.append((i, self.equity))
+        if self.highs[0][0] < start:
+            self.highs.popleft()
+
+        self.run = self.run + 1 if pnl < 0 else 0
+        while self.runs and self.runs[-1][1] <= self.run:
+            self.runs.pop()
+        self.runs.append((i, self.run))
+        if self.runs[0][0] < start:
+            self.runs.popleft()
+
+        if start < 0:
+            return None
+        return {
+            'net': self.net,
+            'profit_factor': self.gross_win / self.gross_loss if self.gross_loss > 0 else None,
+            'sharpe': self._sharpe(),
+            'drawdown': self.equity - self.highs[0][1],
+            'longest_loss_streak': self._longest_run(start),
+        }
+
+    def _add(self, pnl, sign):
+        self.net += sign * pnl
+        self.sq += sign * pnl * pnl
+        if pnl > 0:
+            self.wins += int(sign)
+            self.gross_win = self.gross_win + sign * pnl if self.wins else 0.0  # no residue once all leave
+        elif pnl < 0:
+            self.losses += int(sign)
+            self.gross_loss = self.gross_loss - sign * pnl if self.losses else 0.0
+
+    def _sharpe(self):
+        k = len(self.values)
+        if k < 2:
+            return None
+        mean = self.net / k
+        var = max(self.sq - k * mean * mean, 0.0) / (k - 1)
+        return mean / math.sqrt(var) * self.scale if var > 1e-18 else None
+
+    def _longest_run(self, start):
+        """Longest red-day run inside the window; the run crossing the window start is clipped to it"""
+        j, run = self.runs[0]
+        best = min(run, j - start + 1)
+        if len(self.runs) > 1:
+            best = max(best, self.runs[1][1])
+        return best
+
+def rolling_series(pnl, window, annualization=TRADING_DAYS):
+    """Metrics dict per day (None until the window is full) for a daily P&L sequence"""
+    rw = RollingWindow(window, annualization)
+    return [rw.push(float(p)) for p in pnl]
+
+def period_metrics(days, pnl, annualization=TRADING_DAYS):
+    """Whole-period Sharpe, max drawdown (with its peak and trough days) and longest losing streak"""
+    rw = RollingWindow(max(len(pnl), 1), annualization)
+    peak, peak_day = 0.0, None
+    max_dd, dd_peak, dd_trough = 0.0, None, None
+    longest = 0
+    for day, p in zip(days, pnl):
+        rw.push(float(p))
+        if rw.equity > peak:
+            peak, peak_day = rw.equity, day
+        if rw.equity - peak < max_dd:
+            max_dd, dd_peak, dd_trough = rw.equity - peak, peak_day, day
+        longest = max(longest, rw.run)
+    return {'sharpe': rw._sharpe(), 'max_drawdown': max_dd, 'drawdown_peak': dd_peak,
+            'drawdown_trough': dd_trough, 'longest_loss_streak': longest}
+
+def _r(x, nd=2):
+    return None if x is None else round(x, nd)
+
+def rolling_summary(days, pnl, windows=DEFAULT_WINDOWS, annualization=TRADING_DAYS):
+    """
+    JSON-ready report: whole-period metrics, plus per window the latest value and the worst
+    window (with its end day) for PF, drawdown from the window high and Sharpe, and the longest
+    losing streak seen in any window. Windows longer than the series are None.
+    """
+    days = [str(d) for d in days]
+    pnl = [float(p) for p in pnl]
+    period = period_metrics(days, pnl, annualization)
+    out = {'period': {'sharpe': _r(period['sharpe']), 'max_drawdown': _r(period['max_drawdown']),
+                      'drawdown_peak': period['drawdown_peak'], 'drawdown_trough': period['drawdown_trough'],
+                      'longest_loss_streak': period['longest_loss_streak']},
+           'windows': {}}
+    for window in windows:
+        rw = RollingWindow(window, annualization)
+        latest = worst_pf = worst_dd = low_sharpe = None
+        streak = 0
+        for day, p in zip(days, pnl):
+            m = rw.push(p)
+            if m is None:
+                continue
+            latest = dict(m, end_date=day)
+            if m['profit_factor'] is not None and (worst_pf is None or m['profit_factor'] < worst_pf[0]):
+                worst_pf = (m['profit_factor'], day)
+            if worst_dd is None or m['drawdown'] < worst_dd[0]:
+                worst_dd = (m['drawdown'], day)
+            if m['sharpe'] is not None and (low_sharpe is None or m['sharpe'] < low_sharpe[0]):
+                low_sharpe = (m['sharpe'], day)
+            streak = max(streak, m['longest_loss_streak'])
+        if latest is None:
+            out['windows'][str(window)] = None
+            continue
+        worst = lambda w: {'value': _r(w[0]), 'end_date': w[1]} if w else None
+        out['windows'][str(window)] = {
+            'latest': {k: _r(v) if isinstance(v, float) else v for k, v in latest.items()},
+            'worst_profit_factor': worst(worst_pf),
+            'worst_drawdown': worst(worst_dd),
+            'lowest_sharpe': worst(low_sharpe),
+            'longest_loss_streak': streak,
+        }
+    return out
@@ -0,0 +1,71 @@
+"""
+Resolved table/column mappings, cached per database.
+Auto-detection (table name patterns, PRAGMA table_info per table) runs once per schema: the
+result is stored under the database path and the tool name, together with a hash of the
+table/view SQL of every attached schema, and reused until that hash changes. The cache is plain
+JSON so the mapping an audit ran with can be reviewed, and explicit overrides (YAML) are applied
+on top of it on every run.
+"""
+import hashlib, json, os
+from .loader import quote_ident
+
+CACHE_VERSION = 2  # 2: one detection rule set for both auditors (pm212_core.detect)
+
+def default_cache_path():
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'pm212', 'schema_mappings.json')
+
+def schema_hash(con):
+    """SHA-256 over the CREATE statements of all tables and views in every attached database"""
+    h = hashlib.sha256()
+    for _, name, _ in con.execute("PRAGMA database_list").fetchall():
+        rows = con.execute(f"SELECT type, name, sql FROM {quote_ident(name)}.sqlite_schema "
+                           f"WHERE type IN ('table', 'view') ORDER BY name").fetchall()
+        for row in rows:
+            h.update(repr((name,) + tuple(row)).encode())
+    return h.hexdigest()
+
+def _read_cache(path):
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache.get('entries', {}) if cache.get('version') == CACHE_VERSION else {}
+
+def cached_mapping(con, db_path, tool, detect, cache_path=None):
+    """
+    Mapping for `tool` on this database: the cached one while the schema hash matches, else
+    detect(con) (stored for the next run). cache_path=False disables the cache.
+    """
+    if cache_path is False:
+        return detect(con)
+    cache_path = cache_path or default_cache_path()
+    key = f"{os.path.abspath(db_path)}|{tool}"
+    digest = schema_hash(con)
+    entries = _read_cache(cache_path)
+    entry = entries.get(key)
+    if entry and entry.get('schema_hash') == digest:
+        return entry['mapping']
+
+    mapping = detect(con)
+    entries[key] = {'schema_hash': digest, 'mapping': mapping}
+    try:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'entries': entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # read-only home: detection still worked, it just is not remembered
+    return mapping
+
+def apply_overrides(mapping, overrides):
+    """Mapping with explicit overrides applied; nested dicts (trade_cols, quote_cols) merge key by key"""
+    merged = {k: dict(v) if isinstance(v, dict) else v for k, v in mapping.items()}
+    for k, v in (overrides or {}).items():
+        if isinstance(v, dict) and isinstance(merged.get(k), dict):
+            merged[k].update(v)
+        else:
+            merged[k] = v
+    return merged
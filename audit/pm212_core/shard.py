@@ -0,0 +1,73 @@
+"""
+Time sharding of an audit across worker processes.
+Shards are half-open ranges of the trades' entry-time column compared in the column's own
+storage format, with open-ended first and last ranges, so every ledger row lands in exactly one
+shard whatever its format. Each worker opens its own read-only connection.
+"""
+import pathlib, sqlite3
+import numpy as np
+from .loader import quote_ident
+from .timeparse import parse_timestamps
+from .asof import native_ts_values, sql_time_order
+
+def readonly_connect(path, immutable=False):
+    """
+    Read-only connection (mode=ro). immutable=1 also skips locking and change detection; it is only
+    safe when nothing writes the database while the audit runs.
+    """
+    uri = pathlib.Path(path).resolve().as_uri() + '?mode=ro' + ('&immutable=1' if immutable else '')
+    return sqlite3.connect(uri, uri=True)
+
+MAX_SHARDS = 256
+
+def time_shards(con, table, ts_col, period='Y', epoch_unit='auto', max_shards=MAX_SHARDS):
+    """
+    [(lo, hi)] ranges of ts_col in storage format, one per calendar period ('Y' or 'M') between the
+    column's min and max (consecutive periods are grouped beyond max_shards); lo of the first and
+    hi of the last shard are None (unbounded). `epoch_unit` must match how the auditor parses the column.
+    A column whose SQL order is not time order (sql_time_order) is a single unbounded shard.
+    """
+    if not sql_time_order(con, table, ts_col):
+        return [(None, None)]
+    t = quote_ident(ts_col)
+    lo, hi = con.execute(f"SELECT MIN({t}), MAX({t}) FROM {quote_ident(table)} WHERE {t} IS NOT NULL").fetchone()
+    ends = parse_timestamps(np.array([lo, hi], dtype=object), epoch_unit=epoch_unit)
+    if lo is None or np.isnat(ends).any():
+        return [(None, None)]
+    first, last = ends.astype(f'datetime64[{period}]')
+    step = max(1, -(-int(last - first + 1) // max_shards))
+    cuts = np.arange(first + step, last + 1, step).astype('datetime64[us]').astype(np.int64)
+    bounds = native_ts_values(con, table, ts_col, cuts, None if epoch_unit == 'auto' else epoch_unit) if cuts.size else []
+    return list(zip([None] + bounds, bounds + [None]))
+
+# Slack around a date window in SQL: text with UTC offsets, and date-only text against rendered bounds
+RANGE_PAD_US = 86_400_000_000
+
+def range_where(con, table, ts_col, lo, hi, epoch_unit='auto'):
+    """
+    (SQL filter, params) narrowing ts_col to [lo, hi) (epoch µs, None for an open end) in the
+    column's storage format, padded by RANGE_PAD_US on each side; the exact window is applied
+    after parsing. (None, []) when there is nothing to filter in SQL (no window, SQL order is not
+    time order, or an all-NULL column).
+    """
+    if (lo is None and hi is None) or not sql_time_order(con, table, ts_col):
+        return None, []
+    padded = [None if lo is None else lo - RANGE_PAD_US, None if hi is None else hi + RANGE_PAD_US]
+    bounds = native_ts_values(con, table, ts_col, np.array([v for v in padded if v is not None], dtype=np.int64),
+                              None if epoch_unit == 'auto' else epoch_unit)
+    if bounds is None:
+        return None, []
+    it = iter(bounds)
+    return shard_where(ts_col, *(None if v is None else next(it) for v in padded))
+
+def shard_where(ts_col, lo, hi):
+    """(SQL filter, params) selecting one shard of time_shards"""
+    t = quote_ident(ts_col)
+    terms, params = [], []
+    if lo is not None:
+        terms.append(f"{t} >= ?")
+        params.append(lo)
+    if hi is not None:
+        terms.append(f"{t} < ?")
+        params.append(hi)
+    return ' AND '.join(terms) or f"{t} IS NOT NULL", params
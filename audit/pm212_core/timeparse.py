@@ -0,0 +1,190 @@
+"""
+Timestamp normalization shared by P&L bucketing, sharding and the as-of joins.
+Raw SQLite timestamp columns become int64 epoch microseconds (NAT_US where missing or
+unparseable, which reads as NaT when viewed as datetime64[us]). A column is sniffed once and
+converted in bulk; only values that fit no bulk path are parsed one by one. Accepted: numeric
+epochs in s, ms or µs (unit taken from each value's magnitude unless pinned), the same as numeric
+text, ISO 8601 dates and date-times with 'T' or space, an optional fraction and 'Z' or ±HH:MM
+offset (converted to UTC), and YYYY/MM/DD. Columns mixing these are handled kind by kind.
+"""
+import datetime as dt
+import numpy as np
+
+NAT_US = np.iinfo(np.int64).min
+NAT = np.datetime64('NaT', 'us')
+_EPOCH_TO_US = {'s': 1_000_000, 'ms': 1_000, 'us': 1}
+# Epoch magnitudes from 1e11 are milliseconds, from 1e14 microseconds (unambiguous for 1973-5138)
+_MS_FROM, _US_FROM = 1e11, 1e14
+_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d', '%Y-%m-%d %H:%M')
+TEXT_CHUNK = 1 << 20  # text values per bulk pass (bounds the character-matrix temporaries)
+
+def sniff_format(values):
+    """'epoch' for numeric columns, 'iso' for dash-separated strings, 'slash' for YYYY/MM/DD, None if empty"""
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, (int, float)):
+            return 'epoch'
+        return 'slash' if str(v)[4:5] == '/' else 'iso'
+    return None
+
+def epoch_unit_of(peak):
+    return 'us' if peak >= _US_FROM else 'ms' if peak >= _MS_FROM else 's'
+
+def epoch_unit_for(values):
+    """Epoch unit of a numeric column from its largest magnitude (seconds, ms or µs since 1970)"""
+    vals = np.abs(values[~np.isnan(values)])
+    return epoch_unit_of(vals.max() if vals.size else 0)
+
+def as_epoch_us(ts):
+    """int64 epoch µs from datetime64 (NaT -> NAT_US) or integer µs input"""
+    ts = np.asarray(ts)
+    return ts.astype('datetime64[us]').astype(np.int64) if ts.dtype.kind == 'M' else ts.astype(np.int64)
+
+def _epochs_to_us(x, epoch_unit):
+    """float64 epochs -> int64 µs; 'auto' takes the unit of every value from its magnitude"""
+    out = np.full(x.shape, NAT_US, dtype=np.int64)
+    if epoch_unit == 'auto':
+        mag = np.abs(x)
+        scale = np.where(mag >= _US_FROM, 1.0, np.where(mag >= _MS_FROM, 1e3, 1e6))
+    else:
+        scale = float(_EPOCH_TO_US[epoch_unit])
+    with np.errstate(invalid='ignore', over='ignore'):
+        us = np.round(x * scale)
+    ok = np.isfinite(us) & (np.abs(us) < 9.2e18)
+    out[ok] = us[ok].astype(np.int64)
+    return out
+
+def _parse_text(s):
+    """One date/time string -> epoch µs (aware values converted to UTC), NAT_US if unparseable"""
+    s = s.strip().replace('/', '-')
+    if s.endswith('Z'):
+        s = s[:-1] + '+00:00'
+    try:
+        t = dt.datetime.fromisoformat(s)
+    except ValueError:
+        t = None
+        for fmt in _FORMATS:
+            try:
+                t = dt.datetime.strptime(s[:19], fmt)
+                break
+            except ValueError:
+                continue
+        if t is None:
+            return NAT_US
+    if t.tzinfo is not None:
+        t = t.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return int(np.datetime64(t, 'us').astype(np.int64))
+
+def _parse_any(v, epoch_unit):
+    if v is None:
+        return NAT_US
+    try:
+        return int(_epochs_to_us(np.array([float(v)]), epoch_unit)[0])
+    except (TypeError, ValueError):
+        return _parse_text(str(v))
+
+def _fixed_iso_us(strs):
+    """
+    Fast path for 'YYYY-MM-DD', 'YYYY-MM-DD HH:MM' and 'YYYY-MM-DD HH:MM:SS[.ffffff]' (space or 'T'),
+    read position by position from the code points. Returns (ok, µs); ok is False for any other
+    layout and for invalid dates or times, which are left to the general parsers.
+    """
+    width = strs.dtype.itemsize // 4
+    codes = strs.view(np.uint32).reshape(-1, width)
+    # First 26 code points as bytes, indexed head[position] (non-ASCII clamps to 255)
+    rows = np.zeros((len(codes), 26), dtype=np.uint8)
+    rows[:, :min(width, 26)] = codes[:, :26]
+    wide = np.flatnonzero((codes[:, :26] > 127).any(axis=1))
+    if wide.size:
+        rows[wide, :min(width, 26)] = np.minimum(codes[wide, :26], 255)
+    head = rows.T
+    length = (head != 0).sum(axis=0)
+    if width > 26:
+        length[codes[:, 26] != 0] = 99  # longer than any fast layout
+    digits = head - np.uint8(48)  # wraps for anything below '0': a digit iff <= 9
+    is_digit = digits <= 9
+    digits[head == 0] = 0  # padding past the end reads as 0 (fraction digits)
+    num = lambda *ks: sum(digits[k].astype(np.int32) * 10 ** (len(ks) - 1 - i) for i, k in enumerate(ks))
+
+    ok = (head[4] == 45) & (head[7] == 45) & is_digit[[0, 1, 2, 3, 5, 6, 8, 9]].all(axis=0)
+    timed, secs, frac = length >= 16, length >= 19, length > 19
+    ok &= ~timed | (((head[10] == 32) | (head[10] == 84)) & (head[13] == 58) & is_digit[[11, 12, 14, 15]].all(axis=0))
+    ok &= ~secs | ((head[16] == 58) & is_digit[17] & is_digit[18])
+    frac_ok = (head[19] == 46) & (length > 20) & (length <= 26) & (is_digit[20:] | (head[20:] == 0)).all(axis=0)
+    ok &= (length == 10) | (length == 16) | (length == 19) | (frac & frac_ok)
+
+    month, day = num(5, 6), num(8, 9)
+    hh, mm, ss = num(11, 12) * timed, num(14, 15) * timed, num(17, 18) * secs
+    ok &= (month >= 1) & (month <= 12) & (day >= 1) & (hh < 24) & (mm < 60) & (ss < 60)
+    months = np.where(ok, (num(0, 1, 2, 3) - 1970) * 12 + month - 1, 0).astype('datetime64[M]')
+    start = months.astype('datetime64[D]')
+    ok &= day <= (months + 1).astype('datetime64[D]') - start
+    fraction = num(20, 21, 22, 23, 24, 25) * frac if frac.any() else 0
+    days = start.astype(np.int64) + day - 1
+    return ok, (days * 86400 + (hh * 3600 + mm * 60 + ss)) * 1_000_000 + fraction
+
+def _text_to_us(arr, epoch_unit):
+    """Text (or mixed) slice of a column -> epoch µs"""
+    out = np.full(arr.size, NAT_US, dtype=np.int64)
+    null = arr == None  # noqa: E711 (elementwise None test)
+    strs = np.where(null, '', arr).astype(str)
+    if strs.dtype.itemsize < 80:
+        strs = strs.astype('U20')  # room for the date (10) and the offset test (16 on)
+    width = strs.dtype.itemsize // 4
+    chars = strs.view('U1').reshape(-1, width)
+    if (chars[:, 4] == '/').any():
+        strs = np.char.replace(strs, '/', '-').astype(strs.dtype)
+        chars = strs.view('U1').reshape(-1, width)
+    # Bulk path: naive YYYY-MM-DD shaped values (NumPy would read '1586428860' as a year; offsets are deprecated)
+    shaped = (chars[:, 4] == '-') & (chars[:, 7] == '-')
+    aware = np.zeros(arr.size, dtype=bool)
+    # An offset or Z follows the minutes (16) or the seconds and fraction (19 on)
+    longer = np.flatnonzero(chars[:, 16] != '')
+    if longer.size:
+        tail = chars[longer, 16:]
+        aware[longer] = ((tail == '+') | (tail == '-') | (tail == 'Z')).any(axis=1)
+    naive = np.flatnonzero(shaped & ~aware)
+    fixed, us = _fixed_iso_us(strs[naive])
+    out[naive[fixed]] = us[fixed]
+    naive = naive[~fixed]
+    try:
+        out[naive] = strs[naive].astype('datetime64[us]').astype(np.int64)
+    except ValueError:
+        out[naive] = [_parse_text(v) for v in strs[naive]]
+    rest = np.flatnonzero(~(shaped & ~aware) & ~null)
+    if rest.size:
+        # Numbers and numeric text (epochs) in bulk, anything else one by one
+        try:
+            out[rest] = _epochs_to_us(arr[rest].astype(np.float64), epoch_unit)
+        except (ValueError, TypeError):
+            out[rest] = [_parse_any(v, epoch_unit) for v in arr[rest]]
+    return out
+
+def to_epoch_us(values, epoch_unit='auto'):
+    """
+    Normalize a column of raw SQLite timestamps to int64 epoch µs (NAT_US where unparseable).
+    Numeric values are epochs in `epoch_unit` ('s', 'ms', 'us', or 'auto': per value by magnitude).
+    """
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    fmt = sniff_format(arr)
+    if fmt is None:
+        return np.full(arr.size, NAT_US, dtype=np.int64)
+    if fmt == 'epoch':
+        try:
+            return _epochs_to_us(arr.astype(np.float64), epoch_unit)  # None -> nan -> NAT_US
+        except (ValueError, TypeError):
+            pass  # text mixed in: parsed like a text column
+    return np.concatenate([_text_to_us(arr[lo:lo + TEXT_CHUNK], epoch_unit)
+                           for lo in range(0, arr.size, TEXT_CHUNK)])
+
+def day_bounds_us(start=None, end=None):
+    """[lo, hi) in epoch µs covering the days start..end inclusive (YYYY-MM-DD); None for an open end"""
+    day_us = lambda d: int(d.astype('datetime64[us]').astype(np.int64))
+    return (None if start is None else day_us(np.datetime64(str(start), 'D')),
+            None if end is None else day_us(np.datetime64(str(end), 'D') + 1))
+
+def parse_timestamps(values, epoch_unit='auto'):
+    """to_epoch_us as datetime64[us] (NaT where unparseable)"""
+    return to_epoch_us(values, epoch_unit).view('datetime64[us]')
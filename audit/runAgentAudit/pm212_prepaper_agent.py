@@ -7,10 +7,20 @@ Outputs: Markdown report, JSON summary, CSV anomalies.
 Usage:
   python pm212_prepaper_agent.py --db PM212.sqlite3 [--config pm212_agent_config.yaml]
 """
-import argparse, sqlite3, sys, os, json, math, statistics as stats
-from datetime import datetime, date
+import argparse, asyncio, sqlite3, sys, os, json, math, statistics as stats
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date, timezone
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+from pm212_core import (Ledger, load_trades, nbbo_join, nbbo_check, nbbo_outlier, probe_asof_join, stream_asof_join,
+                        window_asof_join, load_quote_index, resolve_nbbo_mode, epoch_unit_sql, sql_time_order, readonly_connect, time_shards,
+                        shard_where, range_where, DailyAggregate, quote_ident, detect_mapping, guardrail_walk, cached_mapping,
+                        apply_overrides, GuardrailTracker, has_rowid, find_quote_index, create_quote_index, quote_index_ddl,
+                        bootstrap_summary, open_quote_cache, cache_status, default_cache_dir, PhaseTimer,
+                        QUOTES_SCHEMA, split_table, attached_table, attach_quotes, day_bounds_us)
+
 try:
     import yaml
 except Exception:
@@ -18,17 +28,30 @@ except Exception:
 
 def load_config(path):
     default = {
-        'date_range': {'start': '2005-01-01', 'end': '2025-07-31'},
+        'date_range': {'start': None, 'end': None},  # entry days, inclusive; None = unbounded
         'thresholds': {
             'nbbo_within_pct': 98.0,
             'mid_rate_max_pct': 60.0,
             'pf_5c_min': 1.30,
             'pf_10c_min': 1.15,
+            'pf_test': 'point',
             'guardrail_breaches_max': 0
         },
         'execution': {
             'tolerance': 0.01,
-            'slippage_penalty_cents': [0.05, 0.10]
+            'slippage_penalty_cents': [0.05, 0.10],
+            'nbbo_mode': 'auto',
+            'quote_chunk_rows': 250000,
+            'create_quote_index': False,
+            'quote_cache': 'auto',
+            'quote_lookback_days': 7
+        },
+        'bootstrap': {
+            'resamples': 0,
+            'block_days': 5,
+            'confidence': 0.95,
+            'seed': 212,
+            'workers': 1
         }
     }
     if path and yaml:
@@ -42,50 +65,168 @@ def load_config(path):
                 default[k]=v
     return default
 
-def detect_table(cur, patterns):
-    cur.execute("SELECT name FROM sqlite_schema WHERE type='table'")
-    names = [r[0] for r in cur.fetchall()]
-    for pat in patterns:
-        for n in names:
-            if pat.lower() in n.lower():
-                return n
-    return None
-
-def candidate_cols(cur, table):
-    cur.execute(f"PRAGMA table_info({table})")
-    return [r[1] for r in cur.fetchall()]
-
-def pick(cols, candidates):
-    low = {c.lower(): c for c in cols}
-    for c in candidates:
-        if c.lower() in low:
-            return low[c.lower()]
-    return None
-
-def to_dt(s):
-    if s is None: return None
-    if isinstance(s,(int,float)):
-        try:
-            return datetime.utcfromtimestamp(int(s))
-        except: return None
-    s=str(s)
-    for fmt in ('%Y-%m-%d %H:%M:%S','%Y-%m-%dT%H:%M:%S','%Y-%m-%d %H:%M','%Y-%m-%d'):
-        try:
-            return datetime.strptime(s[:19], fmt)
-        except: pass
-    return None
+def nbbo_counts(trades, matched, bid, ask, tol):
+    """([checked, within, mid_or_better], [(rowid, outlier)]) for joined trades"""
+    counts, idx = nbbo_check(trades, matched, bid, ask, tol)
+    return counts, [(int(trades.row_id[i]) if trades.row_id is not None else None, nbbo_outlier(trades, i, bid, ask))
+                    for i in idx]
+
+def audit_shard(task):
+    """Worker: aggregate and NBBO-check the trades of one time shard on its own read-only connection"""
+    con = readonly_connect(task['db'], task['immutable'])
+    timer = PhaseTimer(task['perf'])
+    try:
+        if task['quotes_db']:
+            attach_quotes(con, task['quotes_db'])
+        where, params = shard_where(task['entry_col'], *task['range'])
+        ledger = Ledger(con, task['mapping'], where, params, timer, span=task['span'], lookback=task['lookback'])
+        trades = ledger.trades
+        agg = ledger.aggregate(task['levels'])
+        counts, outliers = [0, 0, 0], []
+        q = task['quotes']
+        if q and len(trades):
+            with timer.phase('nbbo_match', rows=len(trades)):
+                if q['mode'] == 'cache':
+                    matched, bid, ask = open_quote_cache(*q['source'], q['cols'], q['cache_dir']).join(
+                        trades.quote_key, trades.entry_ts)
+                elif q['mode'] == 'indexed':
+                    matched, bid, ask = probe_asof_join(con, q['table'], q['cols'], trades.quote_key, trades.entry_ts,
+                                                        q['unit'])
+                elif q['mode'] == 'stream':
+                    matched, bid, ask = stream_asof_join(con, q['table'], q['cols'], trades.quote_key, trades.entry_ts,
+                                                         q['chunk'], q['unit'])
+                elif not q['ordered']:
+                    # Raw ts order is not time order, so no quote window can be selected in SQL
+                    matched, bid, ask = load_quote_index(con, q['table'], q['cols']).join(trades.quote_key, trades.entry_ts)
+                else:
+                    matched, bid, ask = window_asof_join(con, q['table'], q['cols'], trades.quote_key, trades.entry_ts,
+                                                         q['unit'], ledger.lookback if ledger.span else None)
+                counts, outliers = nbbo_counts(trades, matched, bid, ask, q['tol'])
+        return agg, counts, outliers, timer.phases
+    finally:
+        con.close()
+
+def utc_stamp():
+    """Current UTC time as ISO 8601 with a Z suffix"""
+    return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+def emit_alert(outdir, kind, **fields):
+    """One alert as a JSON line on stdout and in <outdir>/alerts.jsonl"""
+    line = json.dumps(dict({'alert': kind, 'at': utc_stamp()}, **fields))
+    print('ALERT ' + line, flush=True)
+    with open(os.path.join(outdir, 'alerts.jsonl'), 'a') as f:
+        f.write(line + '\n')
+
+async def follow(db, outdir, cfg, trades_tbl, trade_cols, quotes_tbl, qmap, live_mode, poll=0.25, quotes_db=None):
+    """
+    Tail-follow a ledger that is being written (paper trading). History is aggregated once without
+    alerts; after that every commit by another connection (PRAGMA data_version) triggers a read of
+    the rows past the last seen rowid, and each batch updates the guardrail tracker and NBBO counters
+    in time proportional to its size. Alerts: guardrail_breach (first breaching fill of a day),
+    nbbo_outside_band (per fill), nbbo_coverage_low / mid_rate_high (when the running rate crosses
+    its threshold). live_status.json in outdir is refreshed after every batch.
+    """
+    th, ex = cfg['thresholds'], cfg['execution']
+    tol = float(ex['tolerance'])
+    con = readonly_connect(db)
+    if quotes_db:
+        attach_quotes(con, quotes_db)
+    tracker = GuardrailTracker()
+    counts = [0, 0, 0]
+    flags = {'nbbo_coverage_low': False, 'mid_rate_high': False}
+    last_rowid = 0
+    lookback = int(float(ex['quote_lookback_days']) * 86_400_000_000)
+    unit = None
+    if live_mode is not None:
+        # Settled once: per commit they would re-sample the quotes table before every small join
+        unit = epoch_unit_sql(con, quotes_tbl, qmap['ts'])
+        live_mode = resolve_nbbo_mode(con, quotes_tbl, qmap, 0, live_mode)
+
+    def process(trades, mode, live):
+        nonlocal last_rowid
+        if not len(trades):
+            return
+        last_rowid = max(last_rowid, int(trades.row_id.max()))
+        ok = ~np.isnat(trades.entry_ts)
+        days, inverse = np.unique(trades.entry_day()[ok], return_inverse=True)
+        day_net = np.bincount(inverse, weights=trades.net_pnl()[ok], minlength=len(days))
+        last_fill = np.zeros(len(days), dtype=np.int64)
+        np.maximum.at(last_fill, inverse, trades.row_id[ok])
+        for d, pnl, rowid in zip(days.astype(object), day_net.tolist(), last_fill.tolist()):
+            for day, net, allowed, streak in tracker.add(d, pnl):
+                if live:
+                    emit_alert(outdir, 'guardrail_breach', date=str(day), net_pnl=round(net, 2),
+                               allowed=allowed, streak=streak, rowid=rowid)
+        if live_mode is None:
+            return
+        if mode == 'indexed':
+            matched, bid, ask = probe_asof_join(con, quotes_tbl, qmap, trades.quote_key, trades.entry_ts, unit)
+        elif mode == 'window':
+            matched, bid, ask = window_asof_join(con, quotes_tbl, qmap, trades.quote_key, trades.entry_ts, unit, lookback)
+        else:
+            matched, bid, ask, _ = nbbo_join(con, quotes_tbl, qmap, trades.quote_key, trades.entry_ts, mode,
+                                             int(ex['quote_chunk_rows']), lookback=lookback, unit=unit)
+        batch, outliers = nbbo_counts(trades, matched, bid, ask, tol)
+        counts[:] = [a + b for a, b in zip(counts, batch)]
+        if live:
+            for rowid, o in outliers:
+                emit_alert(outdir, 'nbbo_outside_band', rowid=rowid, **o)
+        checked, within, mid_or_better = counts
+        if checked:
+            rates = {'nbbo_coverage_low': ('pct_within', 100.0*within/checked, 100.0*within/checked < th['nbbo_within_pct']),
+                     'mid_rate_high': ('pct_mid_or_better', 100.0*mid_or_better/checked,
+                                       100.0*mid_or_better/checked > th['mid_rate_max_pct'])}
+            for kind, (name, pct, bad) in rates.items():
+                if live and bad and not flags[kind]:
+                    emit_alert(outdir, kind, **{name: round(pct, 2), 'checked': checked})
+                flags[kind] = bad
 
-def profit_factor(series):
-    wins = sum(x for x in series if x>0)
-    losses = abs(sum(x for x in series if x<0))
-    return (wins / losses) if losses>0 else None
+    def write_status():
+        status = {'last_rowid': last_rowid, 'days': len(tracker.days), 'loss_streak': tracker.loss_streak,
+                  'breach_days': sum(tracker.breached),
+                  'nbbo': dict(zip(('checked', 'within', 'mid_or_better'), counts)) if live_mode else None,
+                  'updated': utc_stamp()}
+        path = os.path.join(outdir, 'live_status.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(status, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    process(load_trades(con, trades_tbl, trade_cols), ex['nbbo_mode'], live=False)
+    write_status()
+    print(f"FOLLOWING: {trades_tbl} from rowid {last_rowid} ({len(tracker.days)} days, "
+          f"{sum(tracker.breached)} breach days so far)", flush=True)
+    version = con.execute("PRAGMA data_version").fetchone()[0]
+    while True:
+        await asyncio.sleep(poll)
+        v = con.execute("PRAGMA data_version").fetchone()[0]
+        if v == version:
+            continue
+        version = v
+        process(load_trades(con, trades_tbl, trade_cols, 'rowid > ?', [last_rowid]), live_mode, live=True)
+        write_status()
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument('--db', required=True)
     ap.add_argument('--config', default='pm212_agent_config.yaml')
+    ap.add_argument('--quotes-db', default=None,
+                    help='Separate SQLite database holding the quotes table (ATTACHed; joins still run inside SQLite)')
     ap.add_argument('--outdir', default='pm212_prepaper_out')
+    ap.add_argument('--workers', type=int, default=1,
+                    help='Audit per-year shards on this many processes (report is identical to a serial run)')
+    ap.add_argument('--immutable', action='store_true',
+                    help='Open worker connections with immutable=1; only when nothing writes the DB during the audit')
+    ap.add_argument('--schema-cache', default=None, help='Schema mapping cache file (default: ~/.cache/pm212/schema_mappings.json)')
+    ap.add_argument('--no-schema-cache', action='store_true', help='Always re-detect tables and columns')
+    ap.add_argument('--follow', action='store_true',
+                    help='Keep running and alert on new fills as they are committed (paper trading)')
+    ap.add_argument('--poll', type=float, default=0.25, help='Seconds between change checks in --follow mode')
+    ap.add_argument('--perf', action='store_true',
+                    help='Add per-phase wall time, rows, rows/sec and memory to the summary under "perf"')
+    ap.add_argument('--audit-out', default=None,
+                    help='Also write the pm212_audit.py JSON report, built from the same trade load and NBBO join')
     args = ap.parse_args()
+    timer = PhaseTimer(args.perf)
 
     cfg = load_config(args.config if os.path.exists(args.config) else None)
     os.makedirs(args.outdir, exist_ok=True)
@@ -93,151 +234,178 @@ def main():
     con = sqlite3.connect(args.db)
     con.row_factory = sqlite3.Row
     cur = con.cursor()
+    if args.quotes_db:
+        try:
+            attach_quotes(con, args.quotes_db)
+        except (OSError, sqlite3.Error) as e:
+            print(f'FATAL: {e}')
+            sys.exit(2)
 
-    trades_tbl = detect_table(cur, ['trade','fills','positions'])
-    quotes_tbl = detect_table(cur, ['nbbo','quote','bestbidask','book'])
+    # Table/column mapping: cached per schema (and per --quotes-db), `schema:` config overrides on top
+    with timer.phase('detect'):
+        if args.quotes_db:
+            mapping = apply_overrides(cached_mapping(con, args.db, f'pm212|{os.path.abspath(args.quotes_db)}',
+                                                     lambda c: detect_mapping(c, QUOTES_SCHEMA),
+                                                     False if args.no_schema_cache else args.schema_cache), cfg.get('schema'))
+            mapping['quotes_table'] = attached_table(mapping['quotes_table'])
+        else:
+            mapping = apply_overrides(cached_mapping(con, args.db, 'pm212', detect_mapping,
+                                                     False if args.no_schema_cache else args.schema_cache), cfg.get('schema'))
+    trades_tbl, quotes_tbl = mapping['trades_table'], mapping['quotes_table']
+    trade_cols, qmap = mapping['trade_cols'], mapping['quote_cols']
     if not trades_tbl:
         print('FATAL: trades table not found')
         sys.exit(2)
+    c_tin = trade_cols.get('entry_time')
 
-    tcols = candidate_cols(cur, trades_tbl)
-    c_id    = pick(tcols, ['trade_id','id','rowid'])
-    c_sym   = pick(tcols, ['symbol','underlying','ticker'])
-    c_exp   = pick(tcols, ['expiry','expiration','expiry_date'])
-    c_strk  = pick(tcols, ['strike','strike_price'])
-    c_right = pick(tcols, ['option_type','right','call_put'])
-    c_side  = pick(tcols, ['side','action'])
-    c_qty   = pick(tcols, ['qty','quantity','contracts','size'])
-    c_tin   = pick(tcols, ['entry_time','open_time','time_in','ts_in','timestamp_in','timestamp'])
-    c_tout  = pick(tcols, ['exit_time','close_time','time_out','ts_out'])
-    c_pin   = pick(tcols, ['entry_price','open_price','fill_price','price_in','avg_entry','price'])
-    c_pout  = pick(tcols, ['exit_price','close_price','price_out','avg_exit'])
-    c_real  = pick(tcols, ['realized_pnl','realized','pnl','profit'])
-    c_fees  = pick(tcols, ['fees','commission','commissions','total_fees'])
-    c_mult  = pick(tcols, ['multiplier','contract_multiplier'])
-
-    sel = ','.join([c for c in [c_id,c_sym,c_exp,c_strk,c_right,c_side,c_qty,c_tin,c_tout,c_pin,c_pout,c_real,c_fees,c_mult] if c])
-    cur.execute(f"SELECT {sel} FROM {trades_tbl}")
-    rows = cur.fetchall()
-
-    # Build daily pnl
-    daily = defaultdict(float)
-    for r in rows:
-        entry_dt = to_dt(r[c_tin]) if c_tin else None
-        if not entry_dt: continue
-        day = entry_dt.date()
-        qty = float(r[c_qty] or 0) if c_qty else 0.0
-        mult = float(r[c_mult] or 100) if c_mult else 100.0
-        pin = float(r[c_pin] or 0) if c_pin else 0.0
-        pout= float(r[c_pout] or 0) if c_pout else 0.0
-        fees= float(r[c_fees] or 0) if c_fees else 0.0
-        realized = r[c_real] if c_real in r.keys() else None
-        if realized is None:
-            realized = (pout - pin) * qty * mult
-        else:
-            try: realized = float(realized)
-            except: realized = 0.0
-        daily[day] += (realized - fees)
-
-    # Guardrail check
-    start_loss, fib = 500.0, [300.0,200.0,100.0]
-    loss_streak = 0
-    guardrail_breaches = []
-    for d in sorted(daily.keys()):
-        pnl = daily[d]
-        if pnl >= 0:
-            loss_streak = 0
-            allowed = start_loss
-        else:
-            allowed = fib[min(loss_streak,2)]
-            if abs(pnl) > allowed + 1e-9:
-                guardrail_breaches.append({'date': str(d), 'net_pnl': round(pnl,2), 'allowed': allowed, 'streak': loss_streak})
-            loss_streak = min(3, loss_streak+1)
+    slip_cents = [float(c) for c in cfg['execution']['slippage_penalty_cents']]
+    ex = cfg['execution']
+    # Entry days outside date_range are filtered in SQL (follow mode watches everything new)
+    dr = cfg.get('date_range') or {}
+    span = day_bounds_us(dr.get('start'), dr.get('end'))
+    lookback = int(float(ex['quote_lookback_days']) * 86_400_000_000)
+    tol = float(ex['tolerance'])
+    check_nbbo = bool(quotes_tbl and all(qmap.get(k) for k in ('key', 'ts', 'bid', 'ask')) and c_tin
+                      and trade_cols.get('entry_price') and (trade_cols.get('symbol') or trade_cols.get('quote_key')))
+
+    # Memory-mapped quote cache (pm212_audit.py build-quote-cache) replaces the full quote read when fresh
+    quote_cache = cache_dir = None
+    # The cache belongs to the database file the quotes live in
+    quote_source = (args.quotes_db if split_table(quotes_tbl or '')[0] else args.db, split_table(quotes_tbl or '')[1])
+    if check_nbbo and not args.follow and ex.get('quote_cache', 'auto') not in (False, None, 'off'):
+        cache_dir = None if ex['quote_cache'] in (True, 'auto') else ex['quote_cache']
+        status = cache_status(*quote_source, qmap, cache_dir)
+        if status == 'fresh':
+            with timer.phase('quote_load') as ph:
+                quote_cache = open_quote_cache(*quote_source, qmap, cache_dir)
+                ph['rows'] = len(quote_cache)
+        elif status == 'stale' or cache_dir:
+            print(f"WARNING: quote cache {cache_dir or default_cache_dir(quote_source[0])} is {status}; reading quotes from SQLite",
+                  file=sys.stderr)
+
+    if args.follow:
+        if args.audit_out:
+            print('WARNING: --audit-out is ignored with --follow.', file=sys.stderr)
+        if not c_tin or not has_rowid(con, trades_tbl):
+            print('FATAL: --follow needs an entry time column and a rowid table')
+            sys.exit(2)
+        live_mode = None
+        if check_nbbo:
+            # New fills are probed through the (key, ts) index when there is one, else joined to their quote window
+            if find_quote_index(con, quotes_tbl, qmap['key'], qmap['ts']) is None and ex['create_quote_index']:
+                create_quote_index(con, quotes_tbl, qmap)
+            live_mode = 'indexed' if find_quote_index(con, quotes_tbl, qmap['key'], qmap['ts']) else 'window'
+            if live_mode == 'window':
+                print(f"HINT: per-fill NBBO checks are cheapest with an index{' (in the quotes database)' if args.quotes_db else ''}:"
+                      f"\n  {quote_index_ddl(split_table(quotes_tbl)[1], qmap)};", file=sys.stderr)
+        con.close()
+        try:
+            asyncio.run(follow(args.db, args.outdir, cfg, trades_tbl, trade_cols, quotes_tbl, qmap, live_mode, args.poll,
+                               args.quotes_db))
+        except KeyboardInterrupt:
+            print('STOPPED')
+        return
+
+    if args.workers > 1 and args.audit_out:
+        print('WARNING: --audit-out shares one in-process load of the ledger; --workers is ignored.', file=sys.stderr)
+    if args.workers > 1 and c_tin and not args.audit_out:
+        # Per-year shards on worker processes; partials are merged in shard order
+        with timer.phase('shard_plan'):
+            shards = time_shards(con, trades_tbl, c_tin)
+            quotes = None
+            if check_nbbo:
+                # Only the trades the shards will read (date_range) weigh on the mode choice
+                span_where, span_params = range_where(con, trades_tbl, c_tin, *span)
+                n_trades = con.execute(f"SELECT COUNT(*) FROM {quote_ident(trades_tbl)}"
+                                       + (f" WHERE {span_where}" if span_where else ""), span_params).fetchone()[0]
+                if quote_cache is not None and ex['nbbo_mode'] in ('auto', 'memory'):
+                    mode = 'cache'  # every worker maps the same pages
+                else:
+                    mode = resolve_nbbo_mode(con, quotes_tbl, qmap, n_trades, ex['nbbo_mode'], bool(ex['create_quote_index']))
+                quotes = {'table': quotes_tbl, 'cols': qmap, 'mode': mode, 'tol': tol, 'cache_dir': cache_dir,
+                          'chunk': int(ex['quote_chunk_rows']), 'source': quote_source, 'unit': epoch_unit_sql(con, quotes_tbl, qmap['ts']), 'ordered': sql_time_order(con, quotes_tbl, qmap['ts'])}
+        tasks = [{'db': args.db, 'quotes_db': args.quotes_db, 'span': span, 'lookback': lookback, 'immutable': args.immutable, 'mapping': mapping, 'entry_col': c_tin, 'range': rng, 'levels': slip_cents, 'quotes': quotes, 'perf': args.perf}
+                 for rng in shards]
+        # Worker phases add up over shards (process time, not wall time); 'shards' is the wall time of the pool
+        with timer.phase('shards', rows=len(tasks)):
+            with ProcessPoolExecutor(max_workers=min(args.workers, len(tasks))) as pool:
+                parts = list(pool.map(audit_shard, tasks))
+        for part in parts:
+            timer.merge(part[3])
+        with timer.phase('daily_agg'):
+            agg = DailyAggregate.merge([p[0] for p in parts])
+        counts = np.sum([p[1] for p in parts], axis=0).tolist()
+        # Ledger (rowid) order, as in a serial load
+        outliers = sorted((o for p in parts for o in p[2]), key=lambda o: -1 if o[0] is None else o[0])
+    else:
+        ledger = Ledger(con, mapping, timer=timer, span=span, lookback=lookback)
+        trades = ledger.trades
+        # Daily pnl and all slippage scenarios in one pass
+        agg = ledger.aggregate(slip_cents)
+        counts, outliers = [0, 0, 0], []
+        if check_nbbo:
+            # As-of join against the sorted quote index
+            matched, bid, ask = ledger.entry_quotes(ex['nbbo_mode'], int(ex['quote_chunk_rows']),
+                                                    bool(ex['create_quote_index']), quote_cache)
+            counts, outliers = nbbo_counts(trades, matched, bid, ask, tol)
+
+    # Guardrail check: one walk over the merged days, so the loss streak carries across shard boundaries
+    with timer.phase('guardrail', rows=len(agg.days)):
+        walked, _, _ = guardrail_walk(agg.daily_items())
+    guardrail_breaches = [{'date': str(day), 'net_pnl': round(pnl,2), 'allowed': allowed, 'streak': streak}
+                          for day, pnl, allowed, streak in walked]
 
     # NBBO plausibility if quotes exist
     nbbo_stats = None
-    nbbo_outliers = []
-    if quotes_tbl:
-        qcols = candidate_cols(cur, quotes_tbl)
-        c_q_ts = pick(qcols, ['ts','timestamp','time','quote_time'])
-        c_q_sym= pick(qcols, ['symbol','underlying','ticker'])
-        c_bid  = pick(qcols, ['bid','best_bid'])
-        c_ask  = pick(qcols, ['ask','best_ask'])
-        if c_q_ts and c_q_sym and c_bid and c_ask and c_sym and c_tin and c_pin:
-            # Build simple last-known map per symbol by string time key
-            cur.execute(f"SELECT {c_q_sym} sym, {c_q_ts} ts, {c_bid} bid, {c_ask} ask FROM {quotes_tbl}")
-            qrows = cur.fetchall()
-            symmap = defaultdict(list)
-            for q in qrows:
-                symmap[q['sym']].append((str(q['ts']), float(q['bid'] or 0), float(q['ask'] or 0)))
-            for s in symmap: symmap[s].sort(key=lambda x: x[0])
-
-            def last_before(sym, t):
-                arr = symmap.get(sym, [])
-                lo, hi, best = 0, len(arr)-1, None
-                key = str(t)
-                while lo <= hi:
-                    mid = (lo+hi)//2
-                    if arr[mid][0] <= key:
-                        best = arr[mid]; lo = mid+1
-                    else:
-                        hi = mid-1
-                return best
-
-            checked = within = mid_or_better = 0
-            tol = float(cfg['execution']['tolerance'])
-            for r in rows:
-                sym = r[c_sym] if c_sym else None
-                ts = r[c_tin] if c_tin else None
-                px = float(r[c_pin] or 0) if c_pin else None
-                if not (sym and ts and px is not None):
-                    continue
-                q = last_before(sym, ts)
-                if not q: continue
-                bid, ask = q[1], q[2]
-                checked += 1
-                if (px >= bid - tol) and (px <= ask + tol):
-                    within += 1
-                else:
-                    nbbo_outliers.append({'symbol': sym, 'time': str(ts), 'price': px, 'bid': bid, 'ask': ask})
-                if ask >= bid:
-                    mid = (bid+ask)/2.0
-                    if px >= mid: mid_or_better += 1
-            nbbo_stats = {
-                'checked': checked,
-                'within': within,
-                'pct_within': round(100.0*within/checked,2) if checked else None,
-                'pct_mid_or_better': round(100.0*mid_or_better/checked,2) if checked else None
-            }
-
-    # Slippage stress
-    def pf_with_slip(cents):
-        day = defaultdict(float)
-        for r in rows:
-            entry_dt = to_dt(r[c_tin]) if c_tin else None
-            if not entry_dt: continue
-            qty = float(r[c_qty] or 0) if c_qty else 0.0
-            mult = float(r[c_mult] or 100) if c_mult else 100.0
-            pin = float(r[c_pin] or 0) if c_pin else 0.0
-            pout= float(r[c_pout] or 0) if c_pout else 0.0
-            fees= float(r[c_fees] or 0) if c_fees else 0.0
-            realized = r[c_real] if c_real in r.keys() else None
-            if realized is None:
-                realized = (pout - pin) * qty * mult
-            else:
-                try: realized = float(realized)
-                except: realized = 0.0
-            slip = cents * abs(qty) * mult
-            day[entry_dt.date()] += (realized - fees - slip)
-        series = [v for _,v in sorted(day.items())]
-        pf = profit_factor(series)
-        return {'pf': round(pf,2) if pf else None, 'net_sum': round(sum(series),2)}
+    nbbo_outliers = [o for _, o in outliers]
+    if check_nbbo:
+        checked, within, mid_or_better = counts
+        nbbo_stats = {
+            'checked': checked,
+            'within': within,
+            'pct_within': round(100.0*within/checked,2) if checked else None,
+            'pct_mid_or_better': round(100.0*mid_or_better/checked,2) if checked else None
+        }
 
-    slip_5 = pf_with_slip(0.05)
-    slip_10= pf_with_slip(0.10)
+    # Slippage stress (levels from execution.slippage_penalty_cents, daily PF)
+    def slip_key(cents):
+        return f"{cents*100:g}c"
 
-    # Decision
+    slippage_pf = {}
+    with timer.phase('slippage', rows=len(agg.days) * len(slip_cents)):
+        for j, cents in enumerate(slip_cents):
+            pf = agg.daily_pf(j)
+            slippage_pf[slip_key(cents)] = {'pf': round(pf,2) if pf else None,
+                                            'net_sum': round(float(agg.daily_slipped[:, j].sum()),2)}
+    # Block-bootstrap CIs on daily PF / net per level; pf_test: lower_bound gates on the CI's lower end
     th = cfg['thresholds']
+    bs = cfg['bootstrap']
+    bootstrap = None
+    if int(bs['resamples']) > 0:
+        with timer.phase('bootstrap', rows=int(bs['resamples'])):
+            bootstrap = bootstrap_summary(agg.daily_slipped, list(slippage_pf), int(bs['resamples']), int(bs['block_days']),
+                                          float(bs['confidence']), int(bs['seed']), int(bs['workers']))
+        for key, ci in bootstrap['levels'].items():
+            slippage_pf[key]['pf_ci'] = ci['profit_factor']
+            slippage_pf[key]['net_ci'] = ci['net_sum']
+    pf_test = th.get('pf_test', 'point')
+    if pf_test not in ('point', 'lower_bound'):
+        raise SystemExit(f"thresholds.pf_test must be 'point' or 'lower_bound', got {pf_test!r}")
+    if pf_test == 'lower_bound' and bootstrap is None:
+        raise SystemExit("thresholds.pf_test: lower_bound needs bootstrap.resamples > 0")
+
+    def tested_pf(level):
+        if pf_test == 'lower_bound' and 'pf_ci' in level:
+            return level['pf_ci']['lower']
+        return level['pf']
+
+    no_slip = {'pf': None, 'net_sum': 0}
+    slip_5 = slippage_pf.get('5c', no_slip)
+    slip_10= slippage_pf.get('10c', no_slip)
+    pf_5, pf_10 = tested_pf(slip_5), tested_pf(slip_10)
+    bound = ' (CI lower bound)' if pf_test == 'lower_bound' else ''
+
+    # Decision
     decision = 'APPROVE'
     reasons = []
     if len(guardrail_breaches) > th['guardrail_breaches_max']:
@@ -247,59 +415,83 @@ def main():
             decision = 'REJECT'; reasons.append('NBBO coverage below threshold')
         if nbbo_stats['pct_mid_or_better'] is not None and nbbo_stats['pct_mid_or_better'] > th['mid_rate_max_pct']:
             decision = 'REJECT'; reasons.append('Mid-or-better rate too high (unrealistic fills)')
-    if slip_5['pf'] is not None and slip_5['pf'] < th['pf_5c_min']:
-        decision = 'REJECT'; reasons.append('PF under $0.05 slippage below threshold')
-    if slip_10['pf'] is not None and slip_10['pf'] < th['pf_10c_min']:
-        decision = 'REJECT'; reasons.append('PF under $0.10 slippage below threshold')
+    if pf_5 is not None and pf_5 < th['pf_5c_min']:
+        decision = 'REJECT'; reasons.append(f'PF under $0.05 slippage{bound} below threshold')
+    if pf_10 is not None and pf_10 < th['pf_10c_min']:
+        decision = 'REJECT'; reasons.append(f'PF under $0.10 slippage{bound} below threshold')
 
     summary = {
         'db': args.db,
         'trades_table': trades_tbl,
         'quotes_table': quotes_tbl,
+        'quotes_db': args.quotes_db,
+        'date_range': {'start': dr.get('start') and str(dr['start']), 'end': dr.get('end') and str(dr['end'])},
         'date_generated': datetime.utcnow().isoformat()+ 'Z',
         'thresholds': th,
         'guardrail_breach_count': len(guardrail_breaches),
         'nbbo_stats': nbbo_stats,
-        'slippage_pf': {'5c': slip_5, '10c': slip_10},
+        'slippage_pf': slippage_pf,
+        'bootstrap': {k: v for k, v in bootstrap.items() if k != 'levels'} if bootstrap else None,
         'decision': decision,
         'reasons': reasons
     }
 
-    json_path = os.path.join(args.outdir, 'pm212_prepaper_summary.json')
-    with open(json_path, 'w') as f:
-        json.dump(summary, f, indent=2)
+    audit_report = None
+    if args.audit_out:
+        # pm212_audit.py's report over the same Ledger (trades, daily aggregate and entry quotes are reused),
+        # with the window, tolerance and slippage levels of this config
+        import pm212_audit
+        audit_args = pm212_audit.parse_args([args.db, '--out', args.audit_out, '--no-quote-cache',
+                                             *(['--quotes-db', args.quotes_db] if args.quotes_db else []),
+                                             *(['--start', str(dr['start'])] if dr.get('start') else []),
+                                             *(['--end', str(dr['end'])] if dr.get('end') else []),
+                                             '--quote-lookback', repr(float(ex['quote_lookback_days'])),
+                                             '--tolerance', repr(tol), '--slippage', ','.join(map(repr, slip_cents))])
+        audit_report = pm212_audit.audit(con, mapping, audit_args, timer, ledger)
+
+    with timer.phase('output'):
+        if audit_report is not None:
+            with open(args.audit_out, 'w') as f:
+                f.write(json.dumps(audit_report, indent=2))
+
+        if guardrail_breaches:
+            with open(os.path.join(args.outdir, 'breaches.csv'), 'w') as f:
+                f.write('date,net_pnl,allowed,streak\n')
+                for b in guardrail_breaches:
+                    f.write(f"{b['date']},{b['net_pnl']},{b['allowed']},{b['streak']}\n")
+
+        if nbbo_stats and len(nbbo_outliers)>0:
+            with open(os.path.join(args.outdir, 'nbbo_outliers_sample.csv'), 'w') as f:
+                f.write('symbol,time,price,bid,ask\n')
+                for o in nbbo_outliers[:500]:
+                    f.write(f"{o['symbol']},{o['time']},{o['price']},{o['bid']},{o['ask']}\n")
 
-    if guardrail_breaches:
-        with open(os.path.join(args.outdir, 'breaches.csv'), 'w') as f:
-            f.write('date,net_pnl,allowed,streak\n')
-            for b in guardrail_breaches:
-                f.write(f"{b['date']},{b['net_pnl']},{b['allowed']},{b['streak']}\n")
-
-    if nbbo_stats and len(nbbo_outliers)>0:
-        with open(os.path.join(args.outdir, 'nbbo_outliers_sample.csv'), 'w') as f:
-            f.write('symbol,time,price,bid,ask\n')
-            for o in nbbo_outliers[:500]:
-                f.write(f"{o['symbol']},{o['time']},{o['price']},{o['bid']},{o['ask']}\n")
-
-    md = []
-    md.append(f"# PM212 Pre‑Paper Audit — {os.path.basename(args.db)}")
-    md.append("")
-    md.append(f"**Decision:** {decision}")
-    if reasons:
-        md.append("**Reasons:** " + "; ".join(reasons))
-    md.append("")
-    md.append("## Summary")
-    md.append("```")
-    md.append(json.dumps(summary, indent=2))
-    md.append("```")
-    if guardrail_breaches:
+        md = []
+        md.append(f"# PM212 Pre‑Paper Audit — {os.path.basename(args.db)}")
         md.append("")
-        md.append(f"Guardrail breaches: {len(guardrail_breaches)} (see breaches.csv)")
-    if nbbo_stats and nbbo_outliers:
-        md.append(f"NBBO outliers sample: {min(len(nbbo_outliers),500)} rows in nbbo_outliers_sample.csv")
+        md.append(f"**Decision:** {decision}")
+        if reasons:
+            md.append("**Reasons:** " + "; ".join(reasons))
+        md.append("")
+        md.append("## Summary")
+        md.append("```")
+        md.append(json.dumps(summary, indent=2))
+        md.append("```")
+        if guardrail_breaches:
+            md.append("")
+            md.append(f"Guardrail breaches: {len(guardrail_breaches)} (see breaches.csv)")
+        if nbbo_stats and nbbo_outliers:
+            md.append(f"NBBO outliers sample: {min(len(nbbo_outliers),500)} rows in nbbo_outliers_sample.csv")
+
+        with open(os.path.join(args.outdir, 'pm212_prepaper_report.md'), 'w') as f:
+            f.write('\n'.join(md))
 
-    with open(os.path.join(args.outdir, 'pm212_prepaper_report.md'), 'w') as f:
-        f.write('\n'.join(md))
+    # The report embeds the audit summary only; perf goes in the JSON and stdout
+    if timer.enabled:
+        summary['perf'] = timer.report()
+    json_path = os.path.join(args.outdir, 'pm212_prepaper_summary.json')
+    with open(json_path, 'w') as f:
+        json.dump(summary, f, indent=2)
 
     print(json.dumps(summary, indent=2))
 
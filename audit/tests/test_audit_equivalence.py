@@ -0,0 +1,135 @@
+"""Audits that must agree: every NBBO join mode, incremental vs full, and sharded vs serial pre-paper runs"""
+import json, os, sqlite3, subprocess, sys
+import numpy as np
+import pytest
+from pm212_core import detect_mapping, load_trades, nbbo_join, build_quote_cache, open_quote_cache
+
+AUDIT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AGENT_DIR = os.path.join(AUDIT_DIR, 'runAgentAudit')
+SYMBOLS = ('SPX', 'XSP', 'SPY')
+MODES = ('memory', 'stream', 'indexed', 'auto')
+
+def make_ledger(path, n_trades=240, seed=7):
+    """Three years of trades and sparse quotes, plus entries with no quote in force (too early, unquoted symbol)"""
+    rng = np.random.default_rng(seed)
+    con = sqlite3.connect(path)
+    con.execute('CREATE TABLE trades (symbol TEXT, entry_time TEXT, exit_time TEXT, entry_price REAL, '
+                'exit_price REAL, qty INTEGER, fees REAL)')
+    con.execute('CREATE TABLE quotes (symbol TEXT, ts TEXT, bid REAL, ask REAL)')
+    quotes = []
+    for s, sym in enumerate(SYMBOLS):
+        days = np.datetime64('2019-01-02') + np.sort(rng.choice(3 * 365, 150, replace=False)).astype('timedelta64[D]')
+        for d in days:
+            for m in np.sort(rng.choice(390, 4, replace=False)):
+                t = d.astype('datetime64[m]') + np.timedelta64(14 * 60 + 30 + int(m), 'm')
+                mid = 2.0 + s + rng.normal(0, 0.1)
+                quotes.append((sym, str(t.astype('datetime64[s]')).replace('T', ' '), round(mid - 0.05, 2), round(mid + 0.05, 2)))
+    con.executemany('INSERT INTO quotes VALUES (?,?,?,?)', quotes)
+    add_trades(con, rng, n_trades, '2019-01-01', 3 * 365)
+    con.executemany('INSERT INTO trades VALUES (?,?,?,?,?,?,?)',
+                    [('SPX', '2018-12-31 15:00:00', '2018-12-31 15:30:00', 2.0, 2.2, 1, 1.3),
+                     ('VIX', '2020-06-01 15:00:00', '2020-06-01 15:30:00', 20.0, 19.5, 1, 1.3)])
+    con.commit()
+    con.close()
+
+def add_trades(con, rng, n, first_day, n_days):
+    rows = []
+    for _ in range(n):
+        s = int(rng.integers(len(SYMBOLS)))
+        t = np.datetime64(first_day, 'm') + np.timedelta64(int(rng.integers(n_days)) * 1440 + 14 * 60 + 30 + int(rng.integers(390)), 'm')
+        entry = round(2.0 + s + rng.normal(0, 0.12), 2)
+        rows.append((SYMBOLS[s], str(t.astype('datetime64[s]')).replace('T', ' '),
+                     str((t + np.timedelta64(30, 'm')).astype('datetime64[s]')).replace('T', ' '),
+                     entry, round(entry + rng.normal(0, 0.3), 2), int(rng.integers(1, 4)), 1.3))
+    con.executemany('INSERT INTO trades VALUES (?,?,?,?,?,?,?)', rows)
+
+def run_audit(db, out, *opts):
+    subprocess.run([sys.executable, os.path.join(AUDIT_DIR, 'pm212_audit.py'), str(db), '--out', str(out),
+                    '--no-schema-cache', '--no-quote-cache', *opts], check=True, capture_output=True, cwd=os.path.dirname(out))
+    report = json.loads(open(out).read())
+    for k in ('db', 'perf'):
+        report.pop(k, None)
+    return report
+
+@pytest.fixture
+def ledger(tmp_path):
+    db = tmp_path / 'ledger.db'
+    make_ledger(db)
+    return db
+
+@pytest.mark.parametrize('mode', MODES)
+def test_nbbo_modes_match_memory(ledger, tmp_path, mode):
+    base = run_audit(ledger, tmp_path / 'memory.json', '--nbbo-mode', 'memory')
+    assert base['nbbo_summary']['trades_checked'] > 0
+    opts = {'stream': ('--quote-chunk', '7'), 'indexed': ('--create-index',)}.get(mode, ())
+    assert run_audit(ledger, tmp_path / f'{mode}.json', '--nbbo-mode', mode, *opts) == base
+
+@pytest.mark.parametrize('mode', ('stream', 'indexed'))
+def test_windowed_modes_ignore_lookback(ledger, tmp_path, mode):
+    """A window read short of a quote still finds it: --quote-lookback never changes the report"""
+    window = ('--start', '2020-01-01', '--end', '2020-12-31')
+    base = run_audit(ledger, tmp_path / 'memory.json', *window, '--quote-lookback', '0.01')
+    opts = {'stream': ('--quote-chunk', '7'), 'indexed': ('--create-index',)}[mode]
+    assert run_audit(ledger, tmp_path / f'{mode}.json', *window, '--quote-lookback', '3650', '--nbbo-mode', mode, *opts) == base
+
+def test_join_modes_and_quote_cache_match(ledger, tmp_path):
+    con = sqlite3.connect(ledger)
+    mapping = detect_mapping(con)
+    table, cols = mapping['quotes_table'], mapping['quote_cols']
+    trades = load_trades(con, mapping['trades_table'], mapping['trade_cols'])
+    join = lambda mode, **kw: nbbo_join(con, table, cols, trades.quote_key, trades.entry_ts, mode, **kw)[:3]
+    base = join('memory')
+    cache = open_quote_cache(str(ledger), table, cols, build_quote_cache(con, str(ledger), table, cols, str(tmp_path / 'qc')))
+    for got in (join('stream', chunk=7), join('window'), join('indexed', create_index=True), join('auto', cache=cache)):
+        for want, have in zip(base, got):
+            np.testing.assert_array_equal(want, have)
+    assert 0 < base[0].sum() < len(trades)
+    con.close()
+
+def test_fractional_second_times_match(tmp_path):
+    """Text timestamps with a fraction: probes and windows compare them below the second"""
+    con = sqlite3.connect(tmp_path / 'frac.db')
+    con.execute('CREATE TABLE trades (symbol TEXT, entry_time TEXT, exit_time TEXT, entry_price REAL, exit_price REAL, qty INTEGER)')
+    con.execute('CREATE TABLE quotes (symbol TEXT, ts TEXT, bid REAL, ask REAL)')
+    con.executemany('INSERT INTO quotes VALUES (?,?,?,?)',
+                    [('SPX', '2024-03-01 10:00:00', 1.0, 1.2), ('SPX', '2024-03-01 10:00:30.250', 2.0, 2.2),
+                     ('SPX', '2024-03-01 10:00:30.750', 3.0, 3.2), ('SPX', '2024-03-01 10:01:00', 4.0, 4.2)])
+    con.executemany('INSERT INTO trades VALUES (?,?,?,?,?,?)',
+                    [('SPX', '2024-03-01 10:00:30.500', '2024-03-01 10:05:00', 2.1, 2.3, 1),
+                     ('SPX', '2024-03-01 10:00:30', '2024-03-01 10:05:00', 1.1, 1.3, 1),
+                     ('SPX', '2024-03-01 10:00:30.750', '2024-03-01 10:05:00', 3.1, 3.3, 1)])
+    mapping = detect_mapping(con)
+    table, cols = mapping['quotes_table'], mapping['quote_cols']
+    trades = load_trades(con, mapping['trades_table'], mapping['trade_cols'])
+    join = lambda mode, **kw: nbbo_join(con, table, cols, trades.quote_key, trades.entry_ts, mode, **kw)[:3]
+    base = join('memory')
+    np.testing.assert_array_equal(base[1], [2.0, 1.0, 3.0])
+    for got in (join('stream', chunk=1), join('window'), join('indexed', create_index=True)):
+        for want, have in zip(base, got):
+            np.testing.assert_array_equal(want, have)
+    con.close()
+
+def test_incremental_after_append_matches_full(ledger, tmp_path):
+    run_audit(ledger, tmp_path / 'inc.json', '--incremental')
+    con = sqlite3.connect(ledger)
+    add_trades(con, np.random.default_rng(9), 60, '2021-06-01', 200)  # overlaps days already audited
+    con.commit()
+    con.close()
+    assert run_audit(ledger, tmp_path / 'inc.json', '--incremental') == run_audit(ledger, tmp_path / 'full.json')
+
+def run_agent(db, outdir, *opts):
+    subprocess.run([sys.executable, os.path.join(AGENT_DIR, 'pm212_prepaper_agent.py'), '--db', str(db),
+                    '--outdir', str(outdir), '--no-schema-cache', *opts], check=True, capture_output=True, cwd=os.path.dirname(outdir))
+    summary = json.loads((outdir / 'pm212_prepaper_summary.json').read_text())
+    summary.pop('date_generated', None)
+    csvs = {f: (outdir / f).read_text() for f in sorted(os.listdir(outdir)) if f.endswith('.csv')}
+    return summary, csvs
+
+@pytest.mark.parametrize('mode', ('auto', 'stream'))
+def test_prepaper_workers_match_serial(ledger, tmp_path, mode):
+    config = tmp_path / 'config.yaml'
+    config.write_text(open(os.path.join(AGENT_DIR, 'pm212_agent_config.yaml')).read()
+                      .replace('nbbo_mode: auto', f'nbbo_mode: {mode}').replace('quote_chunk_rows: 250000', 'quote_chunk_rows: 7'))
+    serial = run_agent(ledger, tmp_path / 'serial', '--config', str(config))
+    assert serial[0]['nbbo_stats']['checked'] > 0
+    assert run_agent(ledger, tmp_path / 'sharded', '--config', str(config), '--workers', '3') == serial
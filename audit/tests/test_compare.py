@@ -0,0 +1,53 @@
+"""pm212_audit.py compare against a shared quotes database keyed by contract_id"""
+import json, os, sqlite3, subprocess, sys
+
+AUDIT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTRACTS = 5
+
+def make_quotes(path):
+    con = sqlite3.connect(path)
+    con.execute('CREATE TABLE nbbo_quotes (contract_id TEXT, ts TEXT, bid REAL, ask REAL)')
+    con.executemany('INSERT INTO nbbo_quotes VALUES (?,?,?,?)',
+                    [(f'SPX{c}', f'2021-03-{d:02d} {h}:00:00', 1.0 + c / 10, 1.2 + c / 10)
+                     for c in range(CONTRACTS) for d in range(1, 11) for h in range(10, 16)])
+    con.commit()
+    con.close()
+
+def make_ledger(path, with_contract=True):
+    con = sqlite3.connect(path)
+    key = 'contract_id TEXT, ' if with_contract else ''
+    con.execute(f'CREATE TABLE trades (symbol TEXT, {key}entry_time TEXT, exit_time TEXT, '
+                'entry_price REAL, exit_price REAL, qty INTEGER)')
+    # The ledger's own quotes table is keyed by symbol, so detection picks symbol as its join key
+    con.execute('CREATE TABLE quotes (symbol TEXT, ts TEXT, bid REAL, ask REAL)')
+    rows = [('SPX', f'SPX{i % CONTRACTS}', f'2021-03-{d:02d} 12:30:00', f'2021-03-{d:02d} 15:30:00',
+             1.1 + (i % CONTRACTS) / 10, 1.0 + (i % 3) / 10, 1) for d in range(1, 11) for i in range(4)]
+    if not with_contract:
+        rows = [r[:1] + r[2:] for r in rows]
+    con.executemany(f"INSERT INTO trades VALUES ({','.join('?' * len(rows[0]))})", rows)
+    con.commit()
+    con.close()
+
+def compare(tmp_path, *ledgers):
+    out = tmp_path / 'cmp.json'
+    subprocess.run([sys.executable, os.path.join(AUDIT_DIR, 'pm212_audit.py'), 'compare', *ledgers,
+                    '--quotes', str(tmp_path / 'nbbo.db'), '--out', str(out), '--no-schema-cache'],
+                   check=True, capture_output=True, cwd=tmp_path)
+    return json.loads(out.read_text())
+
+def test_compare_joins_on_shared_quotes_key(tmp_path):
+    make_quotes(tmp_path / 'nbbo.db')
+    make_ledger(tmp_path / 'a.db')
+    result = compare(tmp_path, str(tmp_path / 'a.db'))
+    nbbo = result['ledgers']['a']['nbbo_summary']
+    assert nbbo['trades_checked'] == 40
+    assert nbbo['pct_within_nbbo'] == 100.0
+
+def test_compare_reports_missing_quotes_key(tmp_path):
+    make_quotes(tmp_path / 'nbbo.db')
+    make_ledger(tmp_path / 'a.db')
+    make_ledger(tmp_path / 'b.db', with_contract=False)
+    result = compare(tmp_path, str(tmp_path / 'a.db'), str(tmp_path / 'b.db'))
+    rows = {r['ledger']: r for r in result['comparison']}
+    assert 'error' not in rows['a']
+    assert 'contract_id' in rows['b']['error']
@@ -0,0 +1,18 @@
+"""Text timestamps: UTC offsets and Z are honoured at minute and second precision"""
+import numpy as np
+import pytest
+from pm212_core import to_epoch_us
+
+# Aware values must go to the offset-aware parser, never to NumPy's deprecated timezone handling
+pytestmark = pytest.mark.filterwarnings('error')
+
+def us(text):
+    return int(np.datetime64(text, 'us').astype(np.int64))
+
+def test_minute_precision_offsets():
+    got = to_epoch_us(['2024-03-01T10:00Z', '2024-03-01T10:00+02:00', '2024-03-01 10:00-05:00', '2024-03-01 10:00'])
+    assert got.tolist() == [us('2024-03-01T10:00'), us('2024-03-01T08:00'), us('2024-03-01T15:00'), us('2024-03-01T10:00')]
+
+def test_second_precision_offsets():
+    got = to_epoch_us(['2024-03-01T10:00:30Z', '2024-03-01T10:00:30.250+02:00', '2024-03-01 10:00:30.5'])
+    assert got.tolist() == [us('2024-03-01T10:00:30'), us('2024-03-01T08:00:30.250'), us('2024-03-01T10:00:30.5')]